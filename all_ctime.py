@@ -1,20 +1,52 @@
 #!/usr/bin/env python3
 
+import errno
+import io
 import os
 import re
 import time 
-import glob
 import argparse
+import heapq
+import math
+import select
+import signal
 import stat 
-from datetime import datetime
+import struct
+import zlib
+from array import array
+from collections import deque
+from itertools import islice
+from operator import attrgetter
+
+# Modules only some runs need (Pillow, sqlite3, datetime, json, hashlib,
+# tempfile, concurrent.futures) are imported where first used, so a run with
+# nothing to do starts fast. Pillow and sqlite3 are optional; see
+# _load_pillow() and _load_sqlite3().
+Image = UnidentifiedImageError = None
+sqlite3 = None
+
+
+def _load_pillow():
+    """Import Pillow (PIL) on first use; returns False if it is not installed."""
+    global Image, UnidentifiedImageError
+    if Image is None:
+        try:
+            from PIL import Image, UnidentifiedImageError
+        except ImportError:
+            Image = False
+    return Image is not False
+
+
+def _load_sqlite3():
+    """Import sqlite3 on first use; returns False if Python was built without it."""
+    global sqlite3
+    if sqlite3 is None:
+        try:
+            import sqlite3
+        except ImportError:
+            sqlite3 = False
+    return sqlite3 is not False
 
-# Attempt to import Pillow (PIL)
-PIL_AVAILABLE = False
-try:
-    from PIL import Image, UnidentifiedImageError
-    PIL_AVAILABLE = True
-except ImportError:
-    pass
 
 # --- Configuration ---
 EXTENSIONS = re.compile(
@@ -26,13 +58,124 @@ EXIF_DATE_FALLBACK_TAGS = {
     'DateTimeDigitized': 0x9004,
 }
 DATE_STAMP_FORMAT_REGEX_STR = r"\d{4}\.\d{2}\.\d{2}\.\d{2}\.\d{2}\.\d{2}"
-STANDALONE_DATE_STAMP_REGEX = re.compile(f"^{DATE_STAMP_FORMAT_REGEX_STR}")
-DATE_STAMP_LENGTH = 19
+# Up to two leading stamps, each optionally followed by "_": groups 1/3 are the stamps.
+LEADING_DATE_STAMPS_REGEX = re.compile(f"^({DATE_STAMP_FORMAT_REGEX_STR})(_?)(?:({DATE_STAMP_FORMAT_REGEX_STR})(_?))?")
+EXTENSION_ALIASES = {".jpeg": ".jpg"}
+NAME_STRIP_REGEX = re.compile(r'[\[\]\(\)\s,+&]')
+# str.translate equivalent of NAME_STRIP_REGEX for ASCII names (\s there includes \x1c-\x1f).
+NAME_STRIP_TABLE = str.maketrans("", "", "[](),+&" + "".join(chr(c) for c in range(128) if chr(c).isspace()))
+FAST_HEADER_MAX_BLOCK = 1024 * 1024 # Largest single metadata block the header-only reader will load
+PREFETCH_BYTES = 64 * 1024 # Head of each file --prefetch asks the kernel to read ahead
+TIFF_MAX_IFD_ENTRIES = 4096
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+EXIF_IFD_POINTER_TAG = 0x8769
+TIFF_XMP_TAG = 0x02BC
+EXIF_PAYLOAD_HEADER = b"Exif\x00\x00"
+CACHE_FILENAME = "metadata.sqlite3"
+CACHE_VERSION = 4 # Bump when date extraction or the table layout changes, so cached results are re-extracted
+RENAME_NOREPLACE = 1 # renameat2() flag from <linux/fs.h>
+RESOLVE_BATCH_FILES = 4096 # Candidate files stat()ed and checked against the metadata cache at a time
+PLAN_SPILL_RECORDS = 50000 # Planned renames held in memory per directory before spilling a sorted run to disk
+JOURNAL_FSYNC_EVERY = 256 # Completed renames between journal fsyncs
+DEDUPE_PARTIAL_BYTES = 64 * 1024 # Bytes hashed from each end of a file for --dedupe's quick comparison
+DEDUPE_READ_BYTES = 1024 * 1024 # Block size for --dedupe's full-file hash
+# --watch: a batch is processed once no event arrived for WATCH_DEBOUNCE_SECONDS,
+# or WATCH_MAX_DELAY_SECONDS after its first event, whichever comes first.
+WATCH_DEBOUNCE_SECONDS = 0.2
+WATCH_MAX_DELAY_SECONDS = 2.0
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_EVENT_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+JPEG_XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+PNG_XMP_KEYWORD = b"XML:com.adobe.xmp"
+PNG_RAW_EXIF_KEYWORD = b"Raw profile type exif"
+BMFF_TOP_LEVEL_BOXES = (b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot")
+CONTAINER_MAX_ELEMENTS = 1024 # Video boxes/elements walked per level before giving up on a file
+QUICKTIME_EPOCH_OFFSET = 2082844800 # Seconds from 1904-01-01 (mvhd epoch) to 1970-01-01 UTC
+EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+EBML_DOCTYPE_ID = 0x4282
+MATROSKA_SEGMENT_ID = 0x18538067
+MATROSKA_INFO_ID = 0x1549A966
+MATROSKA_CLUSTER_ID = 0x1F43B675
+MATROSKA_DATEUTC_ID = 0x4461
+MATROSKA_EPOCH_OFFSET = 978307200 # Seconds from 1970-01-01 to 2001-01-01 UTC (DateUTC epoch)
 # --- End Configuration ---
 
 
-def _try_parse_xmp_create_date(img, filepath, vprint_func):
+def _parse_xmp_date_string(xmp_data_string, vprint_func):
     xmp_date_str_iso = None
+    match = re.search(r"<xmp:CreateDate>([^<]+)</xmp:CreateDate>", xmp_data_string)
+    if match:
+        xmp_date_str_iso = match.group(1).strip()
+        vprint_func(f"  - Found XMP xmp:CreateDate: {xmp_date_str_iso}")
+    else:
+        match = re.search(r"<photoshop:DateCreated>([^<]+)</photoshop:DateCreated>", xmp_data_string)
+        if match:
+            xmp_date_str_iso = match.group(1).strip()
+            vprint_func(f"  - Found XMP photoshop:DateCreated: {xmp_date_str_iso}")
+
+    if xmp_date_str_iso:
+        from datetime import datetime
+        try:
+            dt_object = None
+            if xmp_date_str_iso.endswith('Z'):
+                dt_object = datetime.fromisoformat(xmp_date_str_iso[:-1] + '+00:00')
+            else:
+                dt_object = datetime.fromisoformat(xmp_date_str_iso)
+            
+            parsed_date = dt_object.strftime('%Y.%m.%d.%H.%M.%S')
+            vprint_func(f"  - Parsed XMP date: {parsed_date}")
+            return parsed_date
+        except ValueError:
+            vprint_func(f"  Warning: Could not parse ISO XMP date string '{xmp_date_str_iso}' with fromisoformat.")
+            try:
+                dt_part = xmp_date_str_iso[:19].replace('T', ' ')
+                dt_object = datetime.strptime(dt_part, '%Y-%m-%d %H:%M:%S')
+                parsed_date = dt_object.strftime('%Y.%m.%d.%H.%M.%S')
+                vprint_func(f"  - Parsed XMP date (fallback method): {parsed_date}")
+                return parsed_date
+            except ValueError:
+                vprint_func(f"  Warning: Fallback parsing of XMP date part '{dt_part}' also failed.")
+                pass 
+    return None
+
+
+def _parse_exif_date_tags(exif_data, vprint_func):
+    exif_date_str_from_tags = None
+    for tag_name, tag_id in EXIF_DATE_FALLBACK_TAGS.items():
+        date_val = exif_data.get(tag_id)
+        if date_val:
+            vprint_func(f"  - Found EXIF tag '{tag_name}' (ID: {tag_id}): {date_val}")
+            exif_date_str_from_tags = str(date_val)
+            break 
+    
+    if exif_date_str_from_tags:
+        from datetime import datetime
+        try:
+            cleaned_date_str = exif_date_str_from_tags.strip().replace('\x00', '')
+            dt_object = datetime.strptime(cleaned_date_str, '%Y:%m:%d %H:%M:%S')
+            parsed_date = dt_object.strftime('%Y.%m.%d.%H.%M.%S')
+            vprint_func(f"  - Parsed EXIF date: {parsed_date}")
+            return parsed_date
+        except ValueError:
+            vprint_func(f"  Warning: Could not parse EXIF date string '{exif_date_str_from_tags}' from tag.")
+            pass 
+    return None
+
+
+def _try_parse_xmp_create_date(img, filepath, vprint_func):
     try:
         xmp_info = img.getxmp()
         if xmp_info and 'xmp' in xmp_info:
@@ -44,38 +187,7 @@ def _try_parse_xmp_create_date(img, filepath, vprint_func):
                 xmp_data_string = xmp_packet
             
             if xmp_data_string:
-                match = re.search(r"<xmp:CreateDate>([^<]+)</xmp:CreateDate>", xmp_data_string)
-                if match:
-                    xmp_date_str_iso = match.group(1).strip()
-                    vprint_func(f"  - Found XMP xmp:CreateDate: {xmp_date_str_iso}")
-                else:
-                    match = re.search(r"<photoshop:DateCreated>([^<]+)</photoshop:DateCreated>", xmp_data_string)
-                    if match:
-                        xmp_date_str_iso = match.group(1).strip()
-                        vprint_func(f"  - Found XMP photoshop:DateCreated: {xmp_date_str_iso}")
-        
-        if xmp_date_str_iso:
-            try:
-                dt_object = None
-                if xmp_date_str_iso.endswith('Z'):
-                    dt_object = datetime.fromisoformat(xmp_date_str_iso[:-1] + '+00:00')
-                else:
-                    dt_object = datetime.fromisoformat(xmp_date_str_iso)
-                
-                parsed_date = dt_object.strftime('%Y.%m.%d.%H.%M.%S')
-                vprint_func(f"  - Parsed XMP date: {parsed_date}")
-                return parsed_date
-            except ValueError:
-                vprint_func(f"  Warning: Could not parse ISO XMP date string '{xmp_date_str_iso}' with fromisoformat.")
-                try:
-                    dt_part = xmp_date_str_iso[:19].replace('T', ' ')
-                    dt_object = datetime.strptime(dt_part, '%Y-%m-%d %H:%M:%S')
-                    parsed_date = dt_object.strftime('%Y.%m.%d.%H.%M.%S')
-                    vprint_func(f"  - Parsed XMP date (fallback method): {parsed_date}")
-                    return parsed_date
-                except ValueError:
-                    vprint_func(f"  Warning: Fallback parsing of XMP date part '{dt_part}' also failed.")
-                    pass 
+                return _parse_xmp_date_string(xmp_data_string, vprint_func)
     except AttributeError:
         vprint_func(f"  - XMP check: img.getxmp() not available (Pillow < 7.2.0 or not an image type supporting it).")
     except Exception as e_xmp:
@@ -86,29 +198,371 @@ def _try_parse_xmp_create_date(img, filepath, vprint_func):
 def _try_parse_exif_tags(img, filepath, vprint_func):
     exif_data = img._getexif()
     if exif_data:
-        exif_date_str_from_tags = None
-        for tag_name, tag_id in EXIF_DATE_FALLBACK_TAGS.items():
-            date_val = exif_data.get(tag_id)
-            if date_val:
-                vprint_func(f"  - Found EXIF tag '{tag_name}' (ID: {tag_id}): {date_val}")
-                exif_date_str_from_tags = str(date_val)
-                break 
-        
-        if exif_date_str_from_tags:
-            try:
-                cleaned_date_str = exif_date_str_from_tags.strip().replace('\x00', '')
-                dt_object = datetime.strptime(cleaned_date_str, '%Y:%m:%d %H:%M:%S')
-                parsed_date = dt_object.strftime('%Y.%m.%d.%H.%M.%S')
-                vprint_func(f"  - Parsed EXIF date: {parsed_date}")
-                return parsed_date
-            except ValueError:
-                vprint_func(f"  Warning: Could not parse EXIF date string '{exif_date_str_from_tags}' from tag.")
-                pass 
+        return _parse_exif_date_tags(exif_data, vprint_func)
+    return None
+
+
+# --- Header-only metadata reader ---
+# Reads just the container blocks that can hold EXIF/XMP (JPEG APP1, PNG eXIf/iTXt,
+# WebP EXIF/XMP chunks, TIFF IFDs) by seeking over everything else. Each reader
+# returns (exif_tags, xmp_string); exif_tags maps tag id -> str and only carries the
+# tags get_exif_date() cares about. Any structural surprise raises and the caller
+# falls back to Pillow.
+
+def _read_tiff_entry_bytes(fp, base, endian, entry):
+    field_type, count, raw_value = entry
+    size = TIFF_TYPE_SIZES.get(field_type, 1) * count
+    if size > FAST_HEADER_MAX_BLOCK:
+        raise ValueError(f"TIFF field of {size} bytes exceeds header read limit")
+    if size <= 4:
+        return raw_value[:size]
+    offset = struct.unpack(endian + "I", raw_value)[0]
+    fp.seek(base + offset)
+    data = fp.read(size)
+    if len(data) != size:
+        raise ValueError("truncated TIFF field")
+    return data
+
+
+def _read_tiff_ifd(fp, base, endian, offset):
+    fp.seek(base + offset)
+    entry_count = struct.unpack(endian + "H", fp.read(2))[0]
+    if entry_count > TIFF_MAX_IFD_ENTRIES:
+        raise ValueError(f"implausible TIFF IFD entry count {entry_count}")
+    raw_entries = fp.read(entry_count * 12)
+    if len(raw_entries) != entry_count * 12:
+        raise ValueError("truncated TIFF IFD")
+    entries = {}
+    for i in range(entry_count):
+        tag, field_type, count = struct.unpack_from(endian + "HHI", raw_entries, i * 12)
+        entries[tag] = (field_type, count, raw_entries[i * 12 + 8:i * 12 + 12])
+    return entries
+
+
+def _read_tiff_metadata(fp, base=0):
+    fp.seek(base)
+    header = fp.read(8)
+    if header[:4] == b"II*\x00":
+        endian = "<"
+    elif header[:4] == b"MM\x00*":
+        endian = ">"
+    else:
+        raise ValueError("not a TIFF header")
+
+    ifd0 = _read_tiff_ifd(fp, base, endian, struct.unpack(endian + "I", header[4:8])[0])
+    ifds = [ifd0]
+    if EXIF_IFD_POINTER_TAG in ifd0:
+        exif_ifd_offset = struct.unpack(endian + "I", ifd0[EXIF_IFD_POINTER_TAG][2])[0]
+        ifds.append(_read_tiff_ifd(fp, base, endian, exif_ifd_offset))
+
+    exif_tags = {}
+    for ifd in ifds:
+        for tag_id in EXIF_DATE_FALLBACK_TAGS.values():
+            if tag_id in ifd:
+                value = _read_tiff_entry_bytes(fp, base, endian, ifd[tag_id])
+                exif_tags[tag_id] = value.decode('ascii', errors='ignore').rstrip('\x00')
+
+    xmp_data_string = None
+    if TIFF_XMP_TAG in ifd0:
+        xmp_data_string = _read_tiff_entry_bytes(fp, base, endian, ifd0[TIFF_XMP_TAG]).decode('utf-8', errors='ignore')
+    return exif_tags, xmp_data_string
+
+
+def _read_exif_payload(payload):
+    if payload.startswith(EXIF_PAYLOAD_HEADER):
+        payload = payload[len(EXIF_PAYLOAD_HEADER):]
+    exif_tags, _ = _read_tiff_metadata(io.BytesIO(payload))
+    return exif_tags
+
+
+def _read_jpeg_metadata(fp):
+    exif_tags, xmp_data_string = None, None
+    fp.seek(2)
+    while exif_tags is None or xmp_data_string is None:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("lost JPEG marker sync")
+        code = marker[1]
+        while code == 0xFF:
+            code = fp.read(1)[0]
+        if code in (0xD9, 0xDA):  # EOI / SOS: no metadata segments past this point
+            break
+        if 0xD0 <= code <= 0xD7 or code == 0x01:
+            continue
+        payload_length = struct.unpack(">H", fp.read(2))[0] - 2
+        if payload_length < 0:
+            raise ValueError("bad JPEG segment length")
+        if code != 0xE1:
+            fp.seek(payload_length, os.SEEK_CUR)
+            continue
+        payload = fp.read(payload_length)
+        if payload.startswith(EXIF_PAYLOAD_HEADER) and exif_tags is None:
+            exif_tags = _read_exif_payload(payload)
+        elif payload.startswith(JPEG_XMP_HEADER) and xmp_data_string is None:
+            xmp_data_string = payload[len(JPEG_XMP_HEADER):].decode('utf-8', errors='ignore')
+    return exif_tags or {}, xmp_data_string
+
+
+def _read_png_raw_profile(text, compressed):
+    # tEXt/zTXt text after the keyword, in ImageMagick's "Raw profile type"
+    # layout: "\n<name>\n<length>\n" followed by the payload as lines of hex.
+    if compressed:
+        text = zlib.decompress(text[1:]) # Skip the compression method byte
+    return bytes.fromhex("".join(text.decode("latin-1").split("\n")[3:]))
+
+
+def _read_png_metadata(fp):
+    # Chunk headers are walked up to IEND, not just to the first IDAT: eXIf may
+    # come after the image data, and older tools store EXIF as hex in a "Raw
+    # profile type exif" tEXt/zTXt chunk, which only counts if there is no eXIf.
+    # Image data and other chunks are seeked over, never read.
+    exif_tags, xmp_data_string, raw_profile_exif = None, None, None
+    fp.seek(8)
+    while exif_tags is None or xmp_data_string is None:
+        chunk_header = fp.read(8)
+        if len(chunk_header) < 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", chunk_header)
+        if chunk_type == b"IEND":
+            break
+        if chunk_type not in (b"eXIf", b"iTXt", b"tEXt", b"zTXt"):
+            fp.seek(length + 4, os.SEEK_CUR)
+            continue
+        head = fp.read(min(length, 80)) # Keywords are at most 79 bytes plus a NUL
+        if chunk_type in (b"tEXt", b"zTXt") and (raw_profile_exif is not None
+                                                  or not head.startswith(PNG_RAW_EXIF_KEYWORD + b"\x00")):
+            fp.seek(length - len(head) + 4, os.SEEK_CUR)
+            continue
+        if length > FAST_HEADER_MAX_BLOCK:
+            raise ValueError(f"PNG {chunk_type!r} chunk exceeds header read limit")
+        data = head + fp.read(length - len(head))
+        fp.seek(4, os.SEEK_CUR)  # CRC
+        if chunk_type == b"eXIf" and exif_tags is None:
+            exif_tags = _read_exif_payload(data)
+        elif chunk_type == b"iTXt" and xmp_data_string is None:
+            keyword, rest = data.split(b"\x00", 1)
+            if keyword != PNG_XMP_KEYWORD:
+                continue
+            compressed = rest[0]
+            _language, _translated_keyword, text = rest[2:].split(b"\x00", 2)
+            if compressed:
+                text = zlib.decompress(text)
+            xmp_data_string = text.decode('utf-8', errors='ignore')
+        elif chunk_type in (b"tEXt", b"zTXt"):
+            text = data[len(PNG_RAW_EXIF_KEYWORD) + 1:]
+            raw_profile_exif = _read_exif_payload(_read_png_raw_profile(text, chunk_type == b"zTXt"))
+    if exif_tags is None:
+        exif_tags = raw_profile_exif
+    return exif_tags or {}, xmp_data_string
+
+
+def _read_webp_metadata(fp):
+    exif_tags, xmp_data_string = None, None
+    fp.seek(12)
+    while exif_tags is None or xmp_data_string is None:
+        chunk_header = fp.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_type, length = struct.unpack("<4sI", chunk_header)
+        padding = length & 1
+        if chunk_type not in (b"EXIF", b"XMP "):
+            fp.seek(length + padding, os.SEEK_CUR)
+            continue
+        if length > FAST_HEADER_MAX_BLOCK:
+            raise ValueError(f"WebP {chunk_type!r} chunk exceeds header read limit")
+        data = fp.read(length)
+        fp.seek(padding, os.SEEK_CUR)
+        if chunk_type == b"EXIF" and exif_tags is None:
+            exif_tags = _read_exif_payload(data)
+        elif chunk_type == b"XMP " and xmp_data_string is None:
+            xmp_data_string = data.decode('utf-8', errors='ignore')
+    return exif_tags or {}, xmp_data_string
+
+
+def _iter_bmff_boxes(fp, start, end):
+    # Yields (box_type, body_offset, box_end) for the boxes between start and end
+    # (end None: to end of file). Only box headers are read.
+    offset = start
+    for _ in range(CONTAINER_MAX_ELEMENTS):
+        if end is not None and offset + 8 > end:
+            return
+        fp.seek(offset)
+        header = fp.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", fp.read(8))[0]
+            header_size = 16
+        elif size == 0:  # box runs to the end of its parent (or the file)
+            size = (end if end is not None else fp.seek(0, os.SEEK_END)) - offset
+        if size < header_size:
+            raise ValueError(f"bad ISO-BMFF box size {size}")
+        yield box_type, offset + header_size, offset + size
+        offset += size
+    raise ValueError("too many ISO-BMFF boxes")
+
+
+def _read_bmff_creation_time(fp):
+    # moov/mvhd creation_time, as a Unix timestamp. mdat is skipped with a seek,
+    # so a moov stored after the media data costs no payload reads either.
+    for box_type, body, box_end in _iter_bmff_boxes(fp, 0, None):
+        if box_type != b"moov":
+            continue
+        for child_type, child_body, _child_end in _iter_bmff_boxes(fp, body, box_end):
+            if child_type != b"mvhd":
+                continue
+            fp.seek(child_body)
+            data = fp.read(12)
+            if data[0] == 1:
+                created = struct.unpack(">Q", data[4:12])[0]
+            else:
+                created = struct.unpack(">I", data[4:8])[0]
+            return created - QUICKTIME_EPOCH_OFFSET if created else None
+        return None
+    return None
+
+
+def _read_ebml_element_header(fp):
+    # Returns (element_id, data_size); data_size is None for "unknown size".
+    first = fp.read(1)
+    if not first:
+        raise EOFError
+    length = 8 - first[0].bit_length() + 1
+    if length > 4:
+        raise ValueError("bad EBML element id")
+    element_id = int.from_bytes(first + fp.read(length - 1), "big")
+
+    first = fp.read(1)
+    if not first or first[0] == 0:
+        raise ValueError("bad EBML element size")
+    length = 8 - first[0].bit_length() + 1
+    size_bits = first[0] & ((1 << (8 - length)) - 1)
+    data_size = int.from_bytes(bytes([size_bits]) + fp.read(length - 1), "big")
+    if data_size == (1 << (7 * length)) - 1:
+        return element_id, None
+    return element_id, data_size
+
+
+def _read_matroska_metadata(fp):
+    # Returns (doc_type, Segment/Info/DateUTC as a Unix timestamp). The search
+    # stops at the first Cluster: Info always precedes the media data.
+    fp.seek(0)
+    element_id, header_size = _read_ebml_element_header(fp)
+    if header_size is None or header_size > FAST_HEADER_MAX_BLOCK:
+        raise ValueError("bad EBML header")
+    header = io.BytesIO(fp.read(header_size))
+    doc_type = None
+    while header.tell() < header_size:
+        child_id, child_size = _read_ebml_element_header(header)
+        if child_size is None:
+            raise ValueError("unknown-size element in EBML header")
+        if child_id == EBML_DOCTYPE_ID:
+            doc_type = header.read(child_size).rstrip(b"\x00").decode("ascii", errors="ignore")
+        else:
+            header.seek(child_size, os.SEEK_CUR)
+
+    element_id, segment_size = _read_ebml_element_header(fp)
+    if element_id != MATROSKA_SEGMENT_ID:
+        raise ValueError("no Matroska Segment after the EBML header")
+    segment_end = fp.tell() + segment_size if segment_size is not None else None
+    try:
+        for _ in range(CONTAINER_MAX_ELEMENTS):
+            if segment_end is not None and fp.tell() >= segment_end:
+                break
+            element_id, data_size = _read_ebml_element_header(fp)
+            if element_id == MATROSKA_INFO_ID and data_size is not None:
+                info_end = fp.tell() + data_size
+                while fp.tell() < info_end:
+                    child_id, child_size = _read_ebml_element_header(fp)
+                    if child_size is None:
+                        break
+                    if child_id == MATROSKA_DATEUTC_ID and child_size == 8:
+                        nanoseconds = struct.unpack(">q", fp.read(8))[0]
+                        return doc_type, (MATROSKA_EPOCH_OFFSET + nanoseconds / 1e9 if nanoseconds else None)
+                    fp.seek(child_size, os.SEEK_CUR)
+                break
+            if element_id == MATROSKA_CLUSTER_ID or data_size is None:
+                break
+            fp.seek(data_size, os.SEEK_CUR)
+    except EOFError:
+        pass
+    return doc_type, None
+
+
+def read_header_metadata(filepath, fp=None):
+    """Return (format_name, exif_tags, xmp_string, created_timestamp) from the file header.
+
+    created_timestamp is only set for video containers (ISO-BMFF mvhd, Matroska
+    DateUTC), as a Unix timestamp or None; image formats return their EXIF/XMP.
+    Returns None when the format is not one the header-only reader understands
+    or its structure could not be walked; callers should then fall back to Pillow.
+    Raises FileNotFoundError if the file has gone away. fp, if given, is the file
+    already opened for reading in binary mode; it is closed on return.
+    """
+    with fp or open(filepath, 'rb') as fp:
+        magic = fp.read(12)
+        try:
+            if magic.startswith(b"\xff\xd8"):
+                return ("JPEG",) + _read_jpeg_metadata(fp) + (None,)
+            if magic.startswith(b"\x89PNG\r\n\x1a\n"):
+                return ("PNG",) + _read_png_metadata(fp) + (None,)
+            if magic[:4] == b"RIFF" and magic[8:12] == b"WEBP":
+                return ("WebP",) + _read_webp_metadata(fp) + (None,)
+            if magic[:4] in (b"II*\x00", b"MM\x00*"):
+                return ("TIFF",) + _read_tiff_metadata(fp) + (None,)
+            if magic[4:8] in BMFF_TOP_LEVEL_BOXES:
+                return ("QuickTime/MP4", {}, None, _read_bmff_creation_time(fp))
+            if magic.startswith(EBML_MAGIC):
+                doc_type, created = _read_matroska_metadata(fp)
+                return ("WebM" if doc_type == "webm" else "Matroska", {}, None, created)
+        except (ValueError, IndexError, EOFError, OverflowError, struct.error, zlib.error):
+            return None
     return None
+# --- End header-only metadata reader ---
+
+
+def get_exif_date(filepath, vprint_func, fp=None):
+    try:
+        header_metadata = read_header_metadata(filepath, fp)
+    except FileNotFoundError:
+        vprint_func(f"  Error: File not found during EXIF/XMP processing: {filepath}")
+        return None
+    except OSError as e_read:
+        vprint_func(f"  Warning: Could not read header of {os.path.basename(filepath)}: {e_read}")
+        header_metadata = None
+
+    if header_metadata is not None:
+        format_name, exif_tags, xmp_data_string, created_timestamp = header_metadata
+        if format_name in ("QuickTime/MP4", "WebM", "Matroska"):
+            vprint_func(f"  - Checking {format_name} container for a creation date for {os.path.basename(filepath)}...")
+            if created_timestamp is None:
+                vprint_func(f"  - No creation date recorded in {os.path.basename(filepath)}.")
+                return None
+            try:
+                parsed_date = time.strftime("%Y.%m.%d.%H.%M.%S", time.localtime(created_timestamp))
+            except (OverflowError, OSError, ValueError):
+                vprint_func(f"  Warning: Implausible {format_name} creation time {created_timestamp} in {os.path.basename(filepath)}.")
+                return None
+            vprint_func(f"  - Parsed {format_name} creation date (UTC converted to local time): {parsed_date}")
+            return parsed_date
+
+        vprint_func(f"  - Checking {format_name} header XMP metadata for CreateDate for {os.path.basename(filepath)}...")
+        if xmp_data_string:
+            xmp_parsed_date = _parse_xmp_date_string(xmp_data_string, vprint_func)
+            if xmp_parsed_date:
+                return xmp_parsed_date
 
+        vprint_func(f"  - XMP CreateDate not found/parsed, trying standard EXIF tags for {os.path.basename(filepath)}...")
+        exif_tag_parsed_date = _parse_exif_date_tags(exif_tags, vprint_func)
+        if exif_tag_parsed_date:
+            return exif_tag_parsed_date
 
-def get_exif_date(filepath, vprint_func):
-    if not PIL_AVAILABLE:
+        vprint_func(f"  - No usable date found from preferred XMP or standard EXIF tags for {os.path.basename(filepath)}.")
+        return None
+
+    if not _load_pillow():
         vprint_func(f"  - Pillow library not available, cannot read EXIF/XMP for {os.path.basename(filepath)}")
         return None
 
@@ -136,19 +590,321 @@ def get_exif_date(filepath, vprint_func):
     return None
 
 
-def try_remove_executable_bits(filepath, verbose_flag):
+def _get_exif_date_buffered(filepath, fp=None):
+    # Worker entry point for --jobs: verbose lines are collected rather than printed
+    # so the main process can replay them in scan order. The time taken is returned
+    # too, for the per-file latency metrics.
+    messages = []
+    started = time.perf_counter()
+    exif_date = get_exif_date(filepath, messages.append, fp)
+    return exif_date, messages, time.perf_counter() - started
+
+
+def _open_with_readahead(filepath):
+    # Open filepath and ask the kernel to start reading its head in the background.
+    # Returns None if it cannot be opened; the parser then reports the error itself.
+    try:
+        fp = open(filepath, 'rb')
+    except OSError:
+        return None
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fp.fileno(), 0, PREFETCH_BYTES, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+    return fp
+
+
+def _iter_exif_dates_prefetched(filepaths, prefetch):
+    """Yield _get_exif_date_buffered() results for filepaths in order, keeping up to
+    prefetch files opened with readahead requested ahead of the one being parsed.
+
+    The disk then has several header reads queued instead of one, while memory
+    and open descriptors stay bounded by prefetch.
+    """
+    upcoming = iter(filepaths)
+    window = deque()
+    try:
+        for filepath in filepaths:
+            while len(window) <= prefetch:
+                next_path = next(upcoming, None)
+                if next_path is None:
+                    break
+                window.append(_open_with_readahead(next_path))
+            yield _get_exif_date_buffered(filepath, window.popleft())
+    finally:
+        for fp in window:
+            if fp is not None:
+                fp.close()
+
+
+def _extract_exif_dates_chunk(filepaths, prefetch):
+    # Worker entry point for --jobs with --prefetch: one contiguous run of files.
+    return list(_iter_exif_dates_prefetched(filepaths, prefetch))
+
+
+def _map_exif_dates(executor, filepaths, chunksize, prefetch):
+    if prefetch <= 0:
+        yield from executor.map(_get_exif_date_buffered, filepaths, chunksize=chunksize)
+        return
+    chunks = [filepaths[i:i + chunksize] for i in range(0, len(filepaths), chunksize)]
+    for chunk_results in executor.map(_extract_exif_dates_chunk, chunks, [prefetch] * len(chunks)):
+        yield from chunk_results
+
+
+def _extract_exif_dates(filepaths, jobs, executor=None, prefetch=0):
+    if jobs <= 1 or len(filepaths) < 2:
+        if prefetch > 0:
+            yield from _iter_exif_dates_prefetched(filepaths, prefetch)
+            return
+        for filepath in filepaths:
+            yield _get_exif_date_buffered(filepath)
+        return
+
+    chunksize = max(1, len(filepaths) // (jobs * 8))
+    if executor is not None:
+        yield from _map_exif_dates(executor, filepaths, chunksize, prefetch)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from _map_exif_dates(executor, filepaths, chunksize, prefetch)
+
+
+def default_cache_path():
+    cache_root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_root, "all_ctime", CACHE_FILENAME)
+
+
+class MetadataCache:
+    """On-disk cache of EXIF/XMP dates, keyed on file identity.
+
+    Entries are stored per directory and matched on (dev, inode); an entry only
+    counts as a hit while the file's size and mtime_ns are unchanged. Renaming a
+    file within its directory keeps its entry valid. A cache written with a
+    different CACHE_VERSION is discarded.
+
+    Content hashes for --dedupe are kept in a second table on the same identity;
+    they do not depend on date extraction, so only a rebuild discards them.
+    """
+
+    def __init__(self, db_path, rebuild=False):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if rebuild or self.conn.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS metadata")
+            self.conn.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+        if rebuild:
+            self.conn.execute("DROP TABLE IF EXISTS content_hashes")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            " dirpath BLOB NOT NULL, dev INTEGER NOT NULL, ino INTEGER NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " date_str TEXT, date_source TEXT,"
+            " PRIMARY KEY (dev, ino))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS metadata_dirpath ON metadata (dirpath)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS content_hashes ("
+            " dev INTEGER NOT NULL, ino INTEGER NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " partial_hash TEXT, full_hash TEXT,"
+            " PRIMARY KEY (dev, ino))"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _dir_key(dirpath):
+        # Bytes, so directory names that are not valid UTF-8 can be stored too.
+        return os.fsencode(os.path.realpath(dirpath or os.curdir))
+
+    def load_directory(self, dirpath):
+        """Return {(dev, ino): ((size, mtime_ns), date_str, date_source)} for one directory."""
+        rows = self.conn.execute(
+            "SELECT dev, ino, size, mtime_ns, date_str, date_source FROM metadata WHERE dirpath = ?",
+            (self._dir_key(dirpath),),
+        )
+        return {(dev, ino): ((size, mtime_ns), date_str, date_source)
+                for dev, ino, size, mtime_ns, date_str, date_source in rows}
+
+    def load_entries(self, dirpath, keys):
+        """Return load_directory()'s mapping for only the given (dev, ino) keys of dirpath."""
+        dir_key = self._dir_key(dirpath)
+        entries = {}
+        for dev, ino in keys:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, date_str, date_source FROM metadata WHERE dev = ? AND ino = ? AND dirpath = ?",
+                (dev, ino, dir_key),
+            ).fetchone()
+            if row is not None:
+                entries[(dev, ino)] = ((row[0], row[1]), row[2], row[3])
+        return entries
+
+    def save_directory(self, dirpath, updates, stale_keys):
+        """Write new/changed entries and evict stale_keys, the (dev, ino) of files gone from dirpath.
+
+        Content hashes stored for those files are evicted too.
+        """
+        dir_key = self._dir_key(dirpath)
+        with self.conn:
+            self.conn.executemany("DELETE FROM metadata WHERE dev = ? AND ino = ?", stale_keys)
+            self.conn.executemany("DELETE FROM content_hashes WHERE dev = ? AND ino = ?", stale_keys)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO metadata (dirpath, dev, ino, size, mtime_ns, date_str, date_source)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(dir_key, dev, ino, size, mtime_ns, date_str, date_source)
+                 for (dev, ino, size, mtime_ns), (date_str, date_source) in updates.items()],
+            )
+        return len(stale_keys)
+
+    def load_hashes(self, identity):
+        """Return [partial_hash, full_hash] stored for identity (dev, ino, size, mtime_ns), or None."""
+        dev, ino, size, mtime_ns = identity
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, partial_hash, full_hash FROM content_hashes WHERE dev = ? AND ino = ?",
+            (dev, ino),
+        ).fetchone()
+        if row is None or (row[0], row[1]) != (size, mtime_ns):
+            return None
+        return [row[2], row[3]]
+
+    def save_hashes(self, updates):
+        """Write {identity: [partial_hash, full_hash]}, replacing older hashes of the same files."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO content_hashes (dev, ino, size, mtime_ns, partial_hash, full_hash)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(dev, ino, size, mtime_ns, partial_hash, full_hash)
+                 for (dev, ino, size, mtime_ns), (partial_hash, full_hash) in updates.items()],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def open_metadata_cache(args, vprint_func):
+    if not (args.time_from_exif or args.dedupe) or args.no_cache:
+        return None
+    if not _load_sqlite3():
+        vprint_func("Metadata cache disabled: sqlite3 module not available.")
+        return None
+    db_path = default_cache_path()
+    try:
+        cache = MetadataCache(db_path, rebuild=args.rebuild_cache)
+    except (OSError, sqlite3.Error) as e_cache:
+        print(f"Warning: Could not open metadata cache {db_path}: {e_cache}. Continuing without cache.")
+        return None
+    vprint_func(f"Using metadata cache: {db_path}{' (rebuilt)' if args.rebuild_cache else ''}")
+    return cache
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_exif_dates(entries, jobs, cache=None, dirpath="", executor=None, prefetch=0, evict=True):
+    """Yield (entry, exif_date, verbose_messages, seconds) for each entry, in the order given.
+
+    entries is an iterable of DirEntry-like objects (see PathEntry), taken
+    RESOLVE_BATCH_FILES at a time so that only one batch of them and their
+    stat results is held. seconds is the time the extraction itself took, or
+    None for a cache hit.
+
+    With jobs > 1 the extraction runs in a process pool; results are still
+    yielded in input order so everything downstream stays deterministic.
+    When a MetadataCache is given, files whose identity matches a cached entry
+    are not opened at all, and the cache for dirpath is updated once all entries
+    have been yielded; cached files not among them are evicted only if the
+    generator ran to the end.
+    executor, if given, is an existing process pool to use for jobs > 1.
+    prefetch is the number of files to open and read ahead of the one being
+    parsed (see --prefetch); only files that miss the cache are prefetched.
+    evict=False is for a partial list of the directory's files: cached entries
+    of files not in it are then kept rather than dropped as gone.
+    """
+    if cache is None:
+        for batch in _batches(entries, RESOLVE_BATCH_FILES):
+            extracted = _extract_exif_dates([entry.path for entry in batch], jobs, executor, prefetch)
+            for entry in batch:
+                yield (entry,) + next(extracted)
+        return
+
+    # A partial list may be a few new files of a large directory, so only their entries are looked up.
+    cached_entries = cache.load_directory(dirpath) if evict else {}
+    # Cached (dev, ino) keys not yet seen among the entries; what is left at the end is gone.
+    unseen_keys = set(cached_entries) if evict else None
+    updates = {}
+    finished = False
+    try:
+        for batch in _batches(entries, RESOLVE_BATCH_FILES):
+            identities = []
+            for entry in batch:
+                try:
+                    st = entry.stat()
+                    identities.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns))
+                except OSError:
+                    identities.append(None)
+            if not evict:
+                cached_entries = cache.load_entries(dirpath, [identity[:2] for identity in identities if identity])
+
+            to_extract = []
+            for entry, identity in zip(batch, identities):
+                if identity is not None and unseen_keys is not None:
+                    unseen_keys.discard(identity[:2])
+                cached = cached_entries.get(identity[:2]) if identity else None
+                if cached is None or cached[0] != identity[2:]:
+                    to_extract.append(entry.path)
+
+            extracted = _extract_exif_dates(to_extract, jobs, executor, prefetch)
+            for entry, identity in zip(batch, identities):
+                cached = cached_entries.get(identity[:2]) if identity else None
+                if cached is not None and cached[0] == identity[2:]:
+                    cached_date = cached[1]
+                    yield entry, cached_date, [f"  - Metadata cache hit for {entry.name}: {cached_date or 'no EXIF/XMP date'}"], None
+                    continue
+                exif_date, messages, seconds = next(extracted)
+                if identity is not None:
+                    updates[identity] = (exif_date, "EXIF/XMP" if exif_date else None)
+                yield entry, exif_date, messages, seconds
+        finished = True
+    finally:
+        # Runs when the caller closes the generator, so an interrupted run still keeps what it extracted.
+        stale_keys = list(unseen_keys) if finished and unseen_keys is not None else []
+        try:
+            cache.save_directory(dirpath, updates, stale_keys)
+        except sqlite3.Error as e_cache:
+            print(f"Warning: Could not update metadata cache {cache.db_path}: {e_cache}")
+
+
+def try_remove_executable_bits(filepath, verbose_flag, current_mode=None, dir_handle=None):
+    """Clear the executable bits of filepath; returns True if its mode changed.
+
+    current_mode, when known from the scan, saves a stat() call. With an open
+    DirectoryHandle the chmod is relative to its descriptor instead of a path.
+    """
     def vprint_chmod(*pargs, **kwargs):
         if verbose_flag:
             print(*pargs, **kwargs)
             
     try:
-        current_mode = os.stat(filepath).st_mode
+        if current_mode is None:
+            current_mode = os.stat(filepath).st_mode
         if not stat.S_ISREG(current_mode):
             return False
 
         new_mode = current_mode & ~stat.S_IXUSR & ~stat.S_IXGRP & ~stat.S_IXOTH
         if new_mode != current_mode:
-            os.chmod(filepath, new_mode)
+            if dir_handle is not None:
+                dir_handle.chmod(os.path.basename(filepath), new_mode)
+            else:
+                os.chmod(filepath, new_mode)
             vprint_chmod(f"  - Permissions adjusted for: {os.path.basename(filepath)}")
             return True
         else:
@@ -160,273 +916,1650 @@ def try_remove_executable_bits(filepath, verbose_flag):
         print(f"Warning: Could not change permissions for {filepath}: {e_chmod}")
         return False
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Rename media files using EXIF or file creation date, and remove executable bits.",
-        formatter_class=argparse.RawTextHelpFormatter
-    )
-    parser.add_argument(
-        "-t", "--time_from_exif",
-        action="store_true",
-        help="Use EXIF date for filename if available.\n"
-             "If EXIF/XMP date is not found/readable, fallback to file creation time (ctime)."
-    )
-    parser.add_argument(
-        "-f", "--force",
-        action="store_true",
-        help="Force reprocessing of files. \n"
-             " - If file starts with the *correct* date, -f re-processes/re-cleans the suffix.\n"
-             " - If file has correct date *elsewhere* in name, -f processes it.\n"
-             " (Files starting with an *incorrect* date are now re-processed by default)."
-    )
-    parser.add_argument(
-        "-v", "--verbose",
-        action="store_true",
-        help="Enable verbose output, showing detailed processing information and previews."
-    )
-    args = parser.parse_args()
+_renameat2 = None
 
-    _verbose_mode = args.verbose
-    def vprint(*pargs, **kwargs):
-        if _verbose_mode:
-            print(*pargs, **kwargs)
 
-    if args.time_from_exif and not PIL_AVAILABLE:
-        print("Warning: Pillow library is not installed, but -t flag was used. " 
-              "EXIF/XMP data cannot be read. Script will use file creation time (ctime) instead.\n"
-              "To enable EXIF/XMP processing, install Pillow: pip install Pillow")
-
-    seen = {}
-    eligible_files_not_renamed_paths = set()
-    successfully_renamed_original_paths = set()
-
-    scanned_files_count = 0
-    eligible_files_count = 0
-    skipped_datestamped_no_force_count = 0 
-    skipped_empty_after_strip_count = 0
-    skipped_contains_date_no_force_count = 0
-    skipped_no_change_count = 0
-    renamed_count = 0
-    total_permissions_adjusted = 0
-
-    vprint("Scanning files...")
-    for original_filepath in glob.glob("*"):
-        scanned_files_count += 1
-        if not os.path.isfile(original_filepath):
-            continue
+def _renameat2_noreplace(dir_fd, old_name, new_name):
+    """renameat2(RENAME_NOREPLACE) within dir_fd through ctypes.
 
-        if not EXTENSIONS.search(original_filepath):
-            continue
-        
-        eligible_files_count += 1
-        original_basename = os.path.basename(original_filepath)
-        vprint(f"\nProcessing: {original_basename}")
+    Returns 0 on success, the errno value on failure, or None when libc has no
+    renameat2().
+    """
+    global _renameat2
+    if _renameat2 is None:
+        _renameat2 = False
+        try:
+            import ctypes
+            func = ctypes.CDLL(None, use_errno=True).renameat2
+        except (ImportError, OSError, AttributeError):
+            return None
+        func.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+        func.restype = ctypes.c_int
+        _renameat2 = (func, ctypes.get_errno)
+    if _renameat2 is False:
+        return None
+    func, get_errno = _renameat2
+    if func(dir_fd, os.fsencode(old_name), dir_fd, os.fsencode(new_name), RENAME_NOREPLACE) == 0:
+        return 0
+    return get_errno()
 
-        file_date_str = None 
-        date_source = ""
 
-        if args.time_from_exif:
-            exif_date = get_exif_date(original_filepath, vprint) 
-            if exif_date:
-                file_date_str = exif_date
-                date_source = "EXIF/XMP"
-            else:
-                vprint(f"  - EXIF/XMP date not found for {original_basename}, falling back to ctime.")
-                try:
-                    ctime = os.lstat(original_filepath).st_ctime
-                    file_date_str = time.strftime("%Y.%m.%d.%H.%M.%S", time.localtime(ctime))
-                    date_source = "ctime (EXIF/XMP fallback)"
-                    vprint(f"  - Using ctime: {file_date_str}")
-                except Exception as e:
-                    print(f"Error getting ctime for {original_filepath}: {e}") 
-                    eligible_files_not_renamed_paths.add(original_filepath)
-                    continue
-        else: 
+class DirectoryHandle:
+    """One open descriptor for a directory, used for every rename and chmod in it.
+
+    Each operation resolves a single name relative to the descriptor instead of
+    walking the whole path again, saving a lookup per call on network
+    filesystems. Renames use renameat2(RENAME_NOREPLACE) where libc and the
+    filesystem support it, so an existing target is never overwritten without
+    a separate existence check. The directory is opened on first use; where
+    dir_fd is not supported, plain path-based calls are made.
+    """
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath or os.curdir
+        self.fd = None
+        self.use_dir_fd = os.rename in os.supports_dir_fd and os.chmod in os.supports_dir_fd
+        self.noreplace = True
+
+    def _dir_fd(self):
+        if self.fd is None and self.use_dir_fd:
             try:
-                ctime = os.lstat(original_filepath).st_ctime
-                file_date_str = time.strftime("%Y.%m.%d.%H.%M.%S", time.localtime(ctime))
-                date_source = "ctime (default)"
-                vprint(f"  - Using ctime: {file_date_str}")
-            except Exception as e:
-                print(f"Error getting ctime for {original_filepath}: {e}") 
-                eligible_files_not_renamed_paths.add(original_filepath)
-                continue
+                self.fd = os.open(self.dirpath, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+            except OSError:
+                self.use_dir_fd = False
+        return self.fd
 
-        if not file_date_str: 
-            print(f"Warning: Could not determine date for {original_filepath}. Skipping.") 
-            eligible_files_not_renamed_paths.add(original_filepath)
-            continue
+    def rename(self, old_name, new_name):
+        dir_fd = self._dir_fd()
+        if dir_fd is None:
+            os.rename(os.path.join(self.dirpath, old_name), os.path.join(self.dirpath, new_name))
+            return
+        if self.noreplace:
+            err = _renameat2_noreplace(dir_fd, old_name, new_name)
+            if err == 0:
+                return
+            if err not in (None, errno.ENOSYS, errno.EINVAL):
+                raise OSError(err, os.strerror(err), old_name, None, new_name)
+            self.noreplace = False # No renameat2() or no RENAME_NOREPLACE on this filesystem
+        os.rename(old_name, new_name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+
+    def chmod(self, name, mode):
+        dir_fd = self._dir_fd()
+        if dir_fd is None:
+            os.chmod(os.path.join(self.dirpath, name), mode)
+        else:
+            os.chmod(name, mode, dir_fd=dir_fd)
+
+    def stat(self, name):
+        dir_fd = self._dir_fd()
+        if dir_fd is None:
+            return os.stat(os.path.join(self.dirpath, name), follow_symlinks=False)
+        return os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+
+    def replace_with_link(self, target_name, name, temp_name):
+        """Replace name with a hard link to target_name, atomically via temp_name."""
+        dir_fd = self._dir_fd()
+        if dir_fd is None:
+            target_name, name, temp_name = (os.path.join(self.dirpath, n) for n in (target_name, name, temp_name))
+        os.link(target_name, temp_name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        try:
+            os.replace(temp_name, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        except OSError:
+            os.unlink(temp_name, dir_fd=dir_fd)
+            raise
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class RunCounters:
+    """Totals reported in the summary; one per directory, merged into the run total."""
+
+    def __init__(self):
+        self.scanned_files_count = 0
+        self.eligible_files_count = 0
+        self.skipped_datestamped_no_force_count = 0 
+        self.skipped_empty_after_strip_count = 0
+        self.skipped_contains_date_no_force_count = 0
+        self.skipped_no_change_count = 0
+        self.renamed_count = 0
+        self.total_permissions_adjusted = 0
+        self.duplicates_found_count = 0
+        self.duplicates_linked_count = 0
+        self.date_source_counts = {} # date source -> eligible files dated from it
+
+    def merge(self, other):
+        for name, value in vars(other).items():
+            if isinstance(value, dict):
+                totals = getattr(self, name)
+                for key, count in value.items():
+                    totals[key] = totals.get(key, 0) + count
+            else:
+                setattr(self, name, getattr(self, name) + value)
+
+
+class PhaseTimer:
+    """Accumulates wall-clock seconds per named phase of a run.
+
+    Phases nest exclusively: starting a phase pauses the enclosing one, so each
+    second is charged to exactly one phase (e.g. metadata reads inside planning).
+
+    A detailed timer (used for --metrics) also accounts CPU time (this process
+    only; --jobs workers are not included) and honours start_detail(), which
+    splits short per-file steps (stat, normalize, chmod) out of their enclosing
+    phase. Otherwise those calls do nothing, so a plain run pays for neither the
+    extra clock reads nor the per-file bookkeeping. observe() records per-item
+    durations (e.g. one file's metadata read) for percentiles.
+    """
+
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.seconds = {}
+        self.cpu_seconds = {}
+        self.samples = {}
+        self._stack = []
+
+    def _clocks(self):
+        return time.perf_counter(), (time.process_time() if self.detailed else 0.0)
+
+    def start(self, name):
+        now, cpu_now = self._clocks()
+        if self._stack:
+            self._charge(now, cpu_now)
+        self._stack.append([name, now, cpu_now])
+
+    def stop(self):
+        now, cpu_now = self._clocks()
+        self._charge(now, cpu_now)
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][1:] = now, cpu_now
+
+    def start_detail(self, name):
+        if self.detailed:
+            self.start(name)
+
+    def stop_detail(self):
+        if self.detailed:
+            self.stop()
+
+    def _charge(self, now, cpu_now):
+        name, since, cpu_since = self._stack[-1]
+        self.seconds[name] = self.seconds.get(name, 0.0) + (now - since)
+        if self.detailed:
+            self.cpu_seconds[name] = self.cpu_seconds.get(name, 0.0) + (cpu_now - cpu_since)
+
+    def observe(self, name, seconds):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = array('d')
+        samples.append(seconds)
+
+
+class DirectoryScan:
+    """Result of one scan_directory() pass.
+
+    candidates is a list of the names of regular files matching EXTENSIONS, in
+    directory order; they are the same str objects as in names, so a candidate
+    costs one list slot. DateResolver.resolve() stats each file as it gets to
+    it. names holds every name in the directory, hidden ones included, for
+    collision checks. complete is False for a scan of only some of the
+    directory's files (see --watch).
+    """
 
-        filename_to_process = original_basename
-        is_already_datestamped_at_start_match = STANDALONE_DATE_STAMP_REGEX.match(original_basename)
+    __slots__ = ("dirpath", "candidates", "subdirectories", "scanned_count", "names", "complete")
 
-        if is_already_datestamped_at_start_match:
-            filename_current_date_prefix = original_basename[:DATE_STAMP_LENGTH]
-            vprint(f"  - File starts with a date stamp pattern: '{filename_current_date_prefix}'")
+    def __init__(self, dirpath, complete=True):
+        self.dirpath = dirpath
+        self.complete = complete
+        self.candidates = []
+        self.subdirectories = []
+        self.scanned_count = 0
+        self.names = set()
 
-            if filename_current_date_prefix == file_date_str:
-                if not args.force:
-                    vprint(f"  - Skipping (starts with correct date '{file_date_str}' and no -f to re-process suffix).")
-                    skipped_datestamped_no_force_count += 1 
-                    eligible_files_not_renamed_paths.add(original_filepath)
+
+def scan_directory(dirpath, include_subdirs=False):
+    """Scan one directory with a single os.scandir() pass and return a DirectoryScan.
+
+    Hidden entries are not processed, as glob("*") did, and symlinked
+    directories are never followed.
+    """
+    scan = DirectoryScan(dirpath)
+    try:
+        with os.scandir(dirpath or os.curdir) as entries:
+            for entry in entries:
+                scan.names.add(entry.name)
+                if entry.name.startswith('.'):
                     continue
-                else:
-                    vprint(f"  - Force mode: File starts with correct date '{file_date_str}'. Will strip and re-process suffix.")
-                    temp_name = original_basename[DATE_STAMP_LENGTH:]
-                    if temp_name.startswith("_"):
-                        temp_name = temp_name[1:]
-                    filename_to_process = temp_name
-                    
-                    temp_base, temp_ext = os.path.splitext(filename_to_process)
-                    if not temp_base and filename_to_process.startswith('.'):
-                         filename_to_process = f"recovered{filename_to_process}"
-                         vprint(f"  - Name became extension-only after stripping correct date, set to '{filename_to_process}'")
-                    elif not filename_to_process or not temp_base:
-                        print(f"Warning: Filename '{original_basename}' became invalid ('{filename_to_process}') after stripping correct date with -f. Skipping.")
-                        skipped_empty_after_strip_count += 1
-                        eligible_files_not_renamed_paths.add(original_filepath)
+                scan.scanned_count += 1
+                try:
+                    if include_subdirs and entry.is_dir(follow_symlinks=False):
+                        scan.subdirectories.append(os.path.join(dirpath, entry.name))
                         continue
-            else:
-                vprint(f"  - File starts with date '{filename_current_date_prefix}', but new date is '{file_date_str}'. Will re-process.")
-                vprint(f"  - Stripping leading incorrect date stamp(s)...")
-                temp_name = original_basename
-                stripped_count = 0
-                for i_strip in range(2): 
-                    match_obj_strip = STANDALONE_DATE_STAMP_REGEX.match(temp_name)
-                    if match_obj_strip:
-                        old_temp_name_in_strip = temp_name
-                        temp_name = temp_name[DATE_STAMP_LENGTH:]
-                        if temp_name.startswith("_"):
-                            temp_name = temp_name[1:]
-                        stripped_count += 1
-                        vprint(f"    - Strip {i_strip+1}: '{old_temp_name_in_strip[:DATE_STAMP_LENGTH + (1 if old_temp_name_in_strip[DATE_STAMP_LENGTH:].startswith('_') else 0)]}' -> remaining: '{temp_name}'")
-                    else:
-                        break
-                if stripped_count > 0:
-                    filename_to_process = temp_name
-                    vprint(f"  - Base name after stripping incorrect date(s): '{filename_to_process}'")
-                    temp_base, temp_ext = os.path.splitext(filename_to_process)
-                    if not temp_base and filename_to_process.startswith('.'):
-                         filename_to_process = f"recovered{filename_to_process}"
-                         vprint(f"  - Name became extension-only, set to '{filename_to_process}'")
-                    elif not filename_to_process or not temp_base:
-                        print(f"Warning: Filename '{original_basename}' became invalid ('{filename_to_process}') after stripping incorrect date(s). Skipping.")
-                        skipped_empty_after_strip_count += 1
-                        eligible_files_not_renamed_paths.add(original_filepath)
+                    if not EXTENSIONS.search(entry.name) or not entry.is_file():
                         continue
-        elif file_date_str in original_basename and not args.force: 
-            vprint(f"  - Skipping (already contains target date '{file_date_str}' elsewhere, no -f).")
-            skipped_contains_date_no_force_count += 1
-            eligible_files_not_renamed_paths.add(original_filepath)
-            continue
-        
-        name_part, ext_part = os.path.splitext(filename_to_process)
-        processed_name_part = name_part.lower()
-        processed_ext_part = ext_part.lower()
+                except OSError:
+                    continue
+                scan.candidates.append(entry.name)
+    except OSError as e_scan:
+        print(f"Warning: Could not scan directory {dirpath or os.curdir}: {e_scan}")
+    return scan
 
-        if processed_ext_part == ".jpeg":
-            processed_ext_part = ".jpg"
 
-        processed_name_part = re.sub(r'[\[\]\(\)]', '', processed_name_part)
-        processed_name_part = re.sub(r'[\s,+&]', '', processed_name_part)
-        processed_name_part = re.sub(r'^_+', '', processed_name_part)
-        
-        processed_name_part = re.sub(r'^\.+', '', processed_name_part)
+def walk_directories(roots, recursive, timer=None):
+    """Yield a DirectoryScan for one directory at a time, depth first.
 
-        if not processed_name_part:
-            processed_name_part = "untitled" if processed_ext_part else "untitled_file"
-        
-        final_name_suffix = f"_{processed_name_part}{processed_ext_part}"
-        final_name = f"{file_date_str}{final_name_suffix}"
-        vprint(f"  - Proposed new name components: Date='{file_date_str}', Suffix='{final_name_suffix}' -> Tentative: '{final_name}'")
+    Only the current directory's scan and the stack of directories still to
+    visit are held in memory, so very large trees are streamed rather than listed
+    up front. An empty dirpath means the current directory.
+    """
+    timer = timer or PhaseTimer()
+    pending = list(reversed(roots))
+    while pending:
+        timer.start("scan")
+        scan = scan_directory(pending.pop(), include_subdirs=recursive)
+        timer.stop()
+        yield scan
+        pending.extend(reversed(scan.subdirectories))
+
+
+class NameIndex:
+    """Names taken in one directory, with a next-free counter per target name.
+
+    Stands in for probing os.path.exists() on name, name_1, name_2, ...: the
+    directory listing's names are read in place (not copied, as they may be a
+    large directory's), every planned name is added to a set of its own, and
+    each target remembers the counter it reached, so a burst of same-second
+    files resolves in O(1) per file with no attempt limit.
+    """
+
+    def __init__(self, existing_names):
+        self.existing = existing_names
+        self.planned = set()
+        self.next_counter = {}
 
+    def __contains__(self, name):
+        return name in self.planned or name in self.existing
+
+    def claim(self, final_name, original_basename):
+        """Reserve and return a free name for final_name, adding _1, _2, ... as needed.
+
+        Returns original_basename unchanged when the file's own current name is
+        the first non-conflicting candidate (i.e. no rename is needed).
+        """
+        if final_name not in self:
+            self.planned.add(final_name)
+            return final_name
         if final_name == original_basename:
-            vprint(f"  - Skipping (no change needed).")
-            skipped_no_change_count += 1
-            eligible_files_not_renamed_paths.add(original_filepath)
-            continue
+            return original_basename
 
-        counter = 1
-        temp_final_name = final_name
-        base_final_name_for_counter, final_ext_for_counter = os.path.splitext(final_name)
-        
-        while temp_final_name in seen or os.path.exists(temp_final_name):
-            if temp_final_name == original_basename: break 
-            vprint(f"  - Target '{temp_final_name}' exists or conflicts, trying next...")
-            temp_final_name = f"{base_final_name_for_counter}_{counter}{final_ext_for_counter}"
+        base, ext = os.path.splitext(final_name)
+        counter = self.next_counter.get(final_name, 1)
+        # Every counter below next_counter is known to be taken, so if the file
+        # already carries one of them the probe would have stopped at its own name.
+        own_counter = self._counter_of(original_basename, base, ext)
+        if own_counter is not None and 1 <= own_counter < counter:
+            return original_basename
+
+        while True:
+            candidate = f"{base}_{counter}{ext}"
             counter += 1
-            if counter > 100:
-                vprint(f"  Warning: Could not find unique name for '{original_basename}' -> '{final_name}' after 100 attempts. Skipping.")
-                temp_final_name = None
+            if candidate == original_basename or candidate not in self:
                 break
-        
-        if temp_final_name is None or temp_final_name == original_basename:
-            if temp_final_name == original_basename:
-                vprint(f"  - Skipping (resolved to no change after conflict check).")
-                skipped_no_change_count +=1
-            eligible_files_not_renamed_paths.add(original_filepath)
-            continue
+        self.next_counter[final_name] = counter
+        self.planned.add(candidate)
+        return candidate
 
-        final_name = temp_final_name
-        vprint(f"  - Final target name: '{final_name}' (Date from: {date_source})")
-        seen[final_name] = (original_filepath, date_source)
-    
-    vprint("\n--- Scan Summary ---") 
-    if args.verbose: 
-        if skipped_datestamped_no_force_count > 0:
-            vprint(f"  Skipped (starts with correct date, no -f): {skipped_datestamped_no_force_count}")
-        if skipped_empty_after_strip_count > 0:
-            vprint(f"  Skipped (empty/invalid after stripping): {skipped_empty_after_strip_count}")
-        if skipped_contains_date_no_force_count > 0:
-            vprint(f"  Skipped (contained target date elsewhere, no -f): {skipped_contains_date_no_force_count}")
-        if skipped_no_change_count > 0: 
-             vprint(f"  Skipped (no change ultimately needed): {skipped_no_change_count}")
-    
-    if not seen:
-        vprint("No files to rename based on scan criteria.")
-    else:
-        if args.verbose:
-            vprint(f"\nPreview of renames ({len(seen)} files):")
-            for new_name_key, (old_name_val, src) in sorted(seen.items()):
-                vprint(f"  '{os.path.basename(old_name_val)}' -> '{new_name_key}' (using {src} date)")
-        
+    @staticmethod
+    def _counter_of(name, base, ext):
+        if not (name.startswith(base + "_") and name.endswith(ext)):
+            return None
+        suffix = name[len(base) + 1:len(name) - len(ext)]
+        if not (suffix.isascii() and suffix.isdigit()) or str(int(suffix)) != suffix:
+            return None
+        return int(suffix)
+
+
+def _hash_file(filepath, size, full):
+    """blake2b of the whole file, or with full=False of its first and last DEDUPE_PARTIAL_BYTES."""
+    import hashlib
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as f:
+        if full or size <= 2 * DEDUPE_PARTIAL_BYTES:
+            for block in iter(lambda: f.read(DEDUPE_READ_BYTES), b""):
+                digest.update(block)
+        else:
+            digest.update(f.read(DEDUPE_PARTIAL_BYTES))
+            f.seek(-DEDUPE_PARTIAL_BYTES, os.SEEK_END)
+            digest.update(f.read(DEDUPE_PARTIAL_BYTES))
+    return digest.hexdigest()
+
+
+class DuplicateFinder:
+    """Tells whether two files have the same contents, for --dedupe.
+
+    Sizes are compared first, then a hash of each file's first and last
+    DEDUPE_PARTIAL_BYTES, and only when those agree a hash of the whole file,
+    so most non-duplicates cost one stat and at most two small reads. Hashes
+    are keyed on file identity (dev, ino, size, mtime_ns) and, with a
+    MetadataCache, stored in it by flush(), so later runs do not read
+    unchanged files again. With link, plan_directory() plans to replace each
+    duplicate with a hard link to the file it duplicates; otherwise duplicates
+    are only reported.
+    """
+
+    def __init__(self, link=False, metadata_cache=None):
+        self.link = link
+        self.metadata_cache = metadata_cache
+        self._hashes = {} # identity -> [partial_hash, full_hash], None where not computed yet
+        self._updates = {} # identity -> hashes computed since the last flush()
+
+    def _hash(self, filepath, st, full):
+        identity = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        hashes = self._hashes.get(identity)
+        if hashes is None:
+            if self.metadata_cache is not None:
+                hashes = self.metadata_cache.load_hashes(identity)
+            hashes = self._hashes[identity] = hashes or [None, None]
+        if hashes[full] is None:
+            hashes[full] = _hash_file(filepath, st.st_size, full)
+            self._updates[identity] = hashes
+        return hashes[full]
+
+    def same_content(self, filepath_a, st_a, filepath_b, st_b):
+        """Compare two regular files given their lstat() results; may raise OSError."""
+        if st_a.st_size != st_b.st_size:
+            return False
+        if (st_a.st_dev, st_a.st_ino) == (st_b.st_dev, st_b.st_ino):
+            return True
+        if self._hash(filepath_a, st_a, False) != self._hash(filepath_b, st_b, False):
+            return False
+        if st_a.st_size <= 2 * DEDUPE_PARTIAL_BYTES:
+            return True # The partial hash already covered every byte
+        return self._hash(filepath_a, st_a, True) == self._hash(filepath_b, st_b, True)
+
+    def flush(self):
+        """Store hashes computed since the last flush in the cache and forget them."""
+        if self.metadata_cache is not None and self._updates:
+            try:
+                self.metadata_cache.save_hashes(self._updates)
+            except sqlite3.Error as e_cache:
+                print(f"Warning: Could not update metadata cache {self.metadata_cache.db_path}: {e_cache}")
+        self._hashes = {}
+        self._updates = {}
+
+
+def _make_vprint(verbose):
+    def vprint(*pargs, **kwargs):
+        if verbose:
+            print(*pargs, **kwargs)
+    return vprint
+
+
+class ResolvedFile:
+    """Date decision for one candidate file, as yielded by DateResolver.resolve().
+
+    messages are the verbose lines explaining how the date was found; error is
+    set (and date_str is None) when no date could be determined.
+    """
+
+    __slots__ = ("filepath", "dir_entry", "date_str", "date_source", "messages", "error")
+
+    def __init__(self, filepath, dir_entry, date_str=None, date_source="", messages=(), error=None):
+        self.filepath = filepath
+        self.dir_entry = dir_entry
+        self.date_str = date_str
+        self.date_source = date_source
+        self.messages = messages
+        self.error = error
+
+
+class DateResolver:
+    """Works out the date each candidate file should be named after.
+
+    With use_exif the EXIF/XMP date is preferred (see get_exif_date()), falling
+    back to ctime; otherwise ctime is used. The resolver owns the metadata cache
+    and, for jobs > 1, a worker pool that is created on first use and kept for
+    later batches, so a long-running caller pays for neither more than once.
+    Call close() when done.
+    """
+
+    def __init__(self, use_exif=False, jobs=1, metadata_cache=None, prefetch=0):
+        self.use_exif = use_exif
+        self.jobs = jobs
+        self.prefetch = prefetch
+        self.metadata_cache = metadata_cache
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None and self.jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+        return self._executor
+
+    def resolve(self, scan, timer=None):
+        """Yield a ResolvedFile for each candidate of a DirectoryScan, in scan order."""
+        timer = timer or PhaseTimer()
+        entries = (PathEntry(os.path.join(scan.dirpath, name)) for name in scan.candidates)
+        if not self.use_exif:
+            for entry in entries:
+                timer.start_detail("stat")
+                resolved = self._ctime_date(entry.path, entry, "ctime (default)", [])
+                timer.stop_detail()
+                yield resolved
+            return
+
+        exif_results = iter_exif_dates(entries, self.jobs, self.metadata_cache, scan.dirpath,
+                                       executor=self._get_executor(), prefetch=self.prefetch,
+                                       evict=scan.complete)
+        while True:
+            # Run to the end rather than closed, so the metadata cache is saved with evictions.
+            timer.start("metadata")
+            result = next(exif_results, None)
+            timer.stop()
+            if result is None:
+                break
+            entry, exif_date, messages, seconds = result
+            if seconds is not None and timer.detailed:
+                timer.observe("metadata", seconds)
+            if exif_date:
+                yield ResolvedFile(entry.path, entry, exif_date, "EXIF/XMP", messages)
+            else:
+                messages.append(f"  - EXIF/XMP date not found for {entry.name}, falling back to ctime.")
+                timer.start_detail("stat")
+                resolved = self._ctime_date(entry.path, entry, "ctime (EXIF/XMP fallback)", messages)
+                timer.stop_detail()
+                yield resolved
+
+    @staticmethod
+    def _ctime_date(filepath, dir_entry, date_source, messages):
+        try:
+            ctime = dir_entry.stat(follow_symlinks=False).st_ctime
+        except Exception as e:
+            return ResolvedFile(filepath, dir_entry, messages=messages, error=f"Error getting ctime for {filepath}: {e}")
+        file_date_str = time.strftime("%Y.%m.%d.%H.%M.%S", time.localtime(ctime))
+        messages.append(f"  - Using ctime: {file_date_str}")
+        return ResolvedFile(filepath, dir_entry, file_date_str, date_source, messages)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self.metadata_cache is not None:
+            self.metadata_cache.close()
+            self.metadata_cache = None
+
+
+def normalize_suffix(filename):
+    """Return the '_name.ext' suffix a (date-stripped) filename is renamed to.
+
+    The name is lowercased, brackets, whitespace and ,+& are removed, leading
+    underscores and then leading dots are dropped, and the extension is mapped
+    through EXTENSION_ALIASES (.jpeg -> .jpg).
+    """
+    name_part, ext_part = os.path.splitext(filename)
+    processed_ext_part = ext_part.lower()
+    processed_ext_part = EXTENSION_ALIASES.get(processed_ext_part, processed_ext_part)
+
+    processed_name_part = name_part.lower()
+    if processed_name_part.isascii():
+        processed_name_part = processed_name_part.translate(NAME_STRIP_TABLE)
+    else:
+        processed_name_part = NAME_STRIP_REGEX.sub('', processed_name_part)
+    processed_name_part = processed_name_part.lstrip('_').lstrip('.')
+
+    if not processed_name_part:
+        processed_name_part = "untitled" if processed_ext_part else "untitled_file"
+    
+    return f"_{processed_name_part}{processed_ext_part}"
+
+
+def _check_stripped_name(filename_to_process, original_basename, recovered_note, invalid_note, vprint_func):
+    temp_base, temp_ext = os.path.splitext(filename_to_process)
+    if not temp_base and filename_to_process.startswith('.'):
+         filename_to_process = f"recovered{filename_to_process}"
+         vprint_func(f"  - Name became extension-only{recovered_note}, set to '{filename_to_process}'")
+    elif not filename_to_process or not temp_base:
+        print(f"Warning: Filename '{original_basename}' became invalid ('{filename_to_process}') after {invalid_note}. Skipping.")
+        return None
+    return filename_to_process
+
+
+def normalize_name(original_basename, file_date_str, force, vprint_func):
+    """Work out the new name for original_basename given the date it should carry.
+
+    Returns (final_name, skip_reason); when the file should be left alone,
+    final_name is None and skip_reason names the RunCounters field to count it
+    under. Leading date stamps are found with a single match: a stamp that is
+    already correct is kept unless force is set, stale stamps (up to two) are
+    stripped. The remainder is cleaned by normalize_suffix().
+    """
+    filename_to_process = original_basename
+    stamps = LEADING_DATE_STAMPS_REGEX.match(original_basename)
+
+    if stamps:
+        filename_current_date_prefix = stamps.group(1)
+        vprint_func(f"  - File starts with a date stamp pattern: '{filename_current_date_prefix}'")
+
+        if filename_current_date_prefix == file_date_str:
+            if not force:
+                vprint_func(f"  - Skipping (starts with correct date '{file_date_str}' and no -f to re-process suffix).")
+                return None, "skipped_datestamped_no_force_count"
+            vprint_func(f"  - Force mode: File starts with correct date '{file_date_str}'. Will strip and re-process suffix.")
+            filename_to_process = _check_stripped_name(
+                original_basename[stamps.end(2):], original_basename,
+                " after stripping correct date", "stripping correct date with -f", vprint_func)
+        else:
+            vprint_func(f"  - File starts with date '{filename_current_date_prefix}', but new date is '{file_date_str}'. Will re-process.")
+            vprint_func(f"  - Stripping leading incorrect date stamp(s)...")
+            strip_ends = [stamps.end(2)] + ([stamps.end(4)] if stamps.group(3) else [])
+            strip_start = 0
+            for i_strip, strip_end in enumerate(strip_ends):
+                vprint_func(f"    - Strip {i_strip+1}: '{original_basename[strip_start:strip_end]}' -> remaining: '{original_basename[strip_end:]}'")
+                strip_start = strip_end
+            vprint_func(f"  - Base name after stripping incorrect date(s): '{original_basename[strip_start:]}'")
+            filename_to_process = _check_stripped_name(
+                original_basename[strip_start:], original_basename,
+                "", "stripping incorrect date(s)", vprint_func)
+        if filename_to_process is None:
+            return None, "skipped_empty_after_strip_count"
+    elif file_date_str in original_basename and not force: 
+        vprint_func(f"  - Skipping (already contains target date '{file_date_str}' elsewhere, no -f).")
+        return None, "skipped_contains_date_no_force_count"
+    
+    final_name_suffix = normalize_suffix(filename_to_process)
+    final_name = f"{file_date_str}{final_name_suffix}"
+    vprint_func(f"  - Proposed new name components: Date='{file_date_str}', Suffix='{final_name_suffix}' -> Tentative: '{final_name}'")
+    return final_name, None
+
+
+class PlannedRename:
+    """One rename of a RenamePlan; names are basenames within the plan's directory."""
+
+    __slots__ = ("new_name", "old_name", "date_source", "mode")
+
+    def __init__(self, new_name, old_name, date_source, mode):
+        self.new_name = new_name
+        self.old_name = old_name
+        self.date_source = date_source
+        self.mode = mode # st_mode from the scan, or None to stat() again before chmod
+
+
+class KeptFile:
+    """An eligible file a RenamePlan leaves in place; it still gets its executable bits cleared."""
+
+    __slots__ = ("name", "mode")
+
+    def __init__(self, name, mode):
+        self.name = name
+        self.mode = mode
+
+
+class DuplicateFile:
+    """An eligible file of a RenamePlan to be replaced by a hard link to an identical file (--dedupe link).
+
+    original_name is the other file's name once the plan's renames are done.
+    The inode number, size and mtime_ns of both files recorded at planning are
+    checked again before linking, so nothing is linked if either changed in between.
+    """
+
+    __slots__ = ("name", "original_name", "original_ino", "original_size", "original_mtime_ns",
+                 "ino", "size", "mtime_ns", "mode")
+
+    def __init__(self, name, original_name, original_ino, original_size, original_mtime_ns, ino, size, mtime_ns,
+                 mode):
+        self.name = name
+        self.original_name = original_name
+        self.original_ino = original_ino
+        self.original_size = original_size
+        self.original_mtime_ns = original_mtime_ns
+        self.ino = ino
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.mode = mode
+
+
+class SortedSpool:
+    """Records of one __slots__ class, handed back in sorted order of one attribute.
+
+    Up to max_in_memory records are buffered; each time the buffer fills it is
+    sorted and written to a temporary file as a run, and iteration merges the
+    runs back (heapq.merge). Memory therefore stays bounded however many
+    records are added, and no pass ever sorts more than one buffer. Call
+    close() to delete the runs.
+    """
+
+    def __init__(self, record_type, sort_attribute, max_in_memory=PLAN_SPILL_RECORDS):
+        self.record_type = record_type
+        self.sort_key = attrgetter(sort_attribute)
+        self.max_in_memory = max_in_memory
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+
+    def __len__(self):
+        return self.count
+
+    def add(self, record):
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.max_in_memory:
+            self._spill()
+
+    def _spill(self):
+        import json
+        import tempfile
+        self._buffer.sort(key=self.sort_key)
+        run = tempfile.TemporaryFile("w+", encoding="utf-8")
+        slots = self.record_type.__slots__
+        for record in self._buffer:
+            run.write(json.dumps([getattr(record, slot) for slot in slots]) + "\n")
+        self._buffer = []
+        self._runs.append(run)
+
+    def _read_run(self, run):
+        import json
+        run.seek(0)
+        for line in run:
+            yield self.record_type(*json.loads(line))
+
+    def __iter__(self):
+        self._buffer.sort(key=self.sort_key)
+        if not self._runs:
+            return iter(self._buffer)
+        return heapq.merge(self._buffer, *(self._read_run(run) for run in self._runs), key=self.sort_key)
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._buffer = []
+
+
+class RenamePlan:
+    """Renames planned for one directory by plan_directory(), carried out by apply_plan().
+
+    renames holds a PlannedRename per file to rename, in order of new name;
+    kept holds a KeptFile per eligible file that stays where it is, and
+    duplicates a DuplicateFile per file to replace with a hard link. All
+    three spill to disk past PLAN_SPILL_RECORDS entries. Call close() when
+    done with it.
+    """
+
+    __slots__ = ("dirpath", "renames", "kept", "duplicates", "counters")
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        self.renames = SortedSpool(PlannedRename, "new_name")
+        self.kept = SortedSpool(KeptFile, "name")
+        self.duplicates = SortedSpool(DuplicateFile, "name")
+        self.counters = RunCounters()
+
+    def close(self):
+        self.renames.close()
+        self.kept.close()
+        self.duplicates.close()
+
+
+def _find_duplicate(finder, name_index, families, planned_sources, dirpath, final_name, original_basename, st):
+    """Return (name, current_name, stat) of a file using final_name or one of its _N
+    variants whose contents match original_basename's, or None.
+
+    families maps each target name to {size: [(name, current_name, stat), ...]}
+    for the names using it; a target's entry is filled from the NameIndex the
+    first time one of its names is wanted again, and plan_directory() adds
+    every later claim. current_name differs from name for a file this plan
+    renames; planned_sources maps such planned names to current ones.
+    """
+    family = families.get(final_name)
+    if family is None:
+        family = families[final_name] = {}
+        base, ext = os.path.splitext(final_name)
+        name, counter = final_name, 1
+        while name in name_index:
+            current_name = planned_sources.get(name, name)
+            try:
+                member_st = os.stat(os.path.join(dirpath, current_name), follow_symlinks=False)
+            except OSError:
+                member_st = None
+            if member_st is not None and stat.S_ISREG(member_st.st_mode):
+                family.setdefault(member_st.st_size, []).append((name, current_name, member_st))
+            name = f"{base}_{counter}{ext}"
+            counter += 1
+
+    filepath = os.path.join(dirpath, original_basename)
+    for member in family.get(st.st_size, ()):
+        name, current_name, member_st = member
+        if current_name == original_basename:
+            continue
+        try:
+            if finder.same_content(filepath, st, os.path.join(dirpath, current_name), member_st):
+                return member
+        except OSError as e_hash:
+            print(f"Warning: Could not compare {filepath} with {os.path.join(dirpath, current_name)}: {e_hash}")
+    return None
+
+
+def plan_directory(scan, resolver, force=False, verbose=False, timer=None, dedupe=None):
+    """Decide the new name of every candidate in a DirectoryScan and return a RenamePlan.
+
+    Nothing on disk is changed. force has the meaning of the -f option. With
+    a DuplicateFinder as dedupe, a file whose target name is taken is first
+    compared with the files using that name and its _N variants; if one has
+    the same contents the file is reported (and with dedupe.link planned for
+    linking) instead of getting a new _N name. Time spent is charged to the
+    "plan" phase of timer, except the resolver's "metadata" time, "dedupe"
+    for content comparisons and, with a detailed timer, "normalize" and "stat".
+    """
+    vprint = _make_vprint(verbose)
+    timer = timer or PhaseTimer()
+    plan = RenamePlan(scan.dirpath)
+    counters = plan.counters
+    counters.scanned_files_count = scan.scanned_count
+    name_index = NameIndex(scan.names)
+    families = {} # target name -> files using it and its _N variants, by size; see _find_duplicate()
+    planned_sources = {} # planned new name -> current name, kept with dedupe only
+
+    if scan.dirpath:
+        vprint(f"\nDirectory: {scan.dirpath}")
+
+    timer.start("plan")
+    for resolved in resolver.resolve(scan, timer):
+        original_filepath = resolved.filepath
+        counters.eligible_files_count += 1
+        source_key = resolved.date_source or "unresolved"
+        counters.date_source_counts[source_key] = counters.date_source_counts.get(source_key, 0) + 1
+        original_basename = os.path.basename(original_filepath)
+        try:
+            scanned_mode = resolved.dir_entry.stat().st_mode
+        except OSError:
+            scanned_mode = None
+        vprint(f"\nProcessing: {original_basename}")
+        for message in resolved.messages:
+            vprint(message)
+        if resolved.error:
+            print(resolved.error)
+            plan.kept.add(KeptFile(original_basename, scanned_mode))
+            continue
+
+        file_date_str = resolved.date_str
+        date_source = resolved.date_source
+        if not file_date_str: 
+            print(f"Warning: Could not determine date for {original_filepath}. Skipping.") 
+            plan.kept.add(KeptFile(original_basename, scanned_mode))
+            continue
+
+        timer.start_detail("normalize")
+        final_name, skip_reason = normalize_name(original_basename, file_date_str, force, vprint)
+        timer.stop_detail()
+        if skip_reason:
+            setattr(counters, skip_reason, getattr(counters, skip_reason) + 1)
+            plan.kept.add(KeptFile(original_basename, scanned_mode))
+            continue
+
+        if final_name == original_basename:
+            vprint(f"  - Skipping (no change needed).")
+            counters.skipped_no_change_count += 1
+            plan.kept.add(KeptFile(original_basename, scanned_mode))
+            continue
+
+        if dedupe is not None and final_name in name_index:
+            try:
+                file_st = resolved.dir_entry.stat(follow_symlinks=False)
+            except OSError:
+                file_st = None
+            duplicate = None
+            if file_st is not None and stat.S_ISREG(file_st.st_mode):
+                timer.start("dedupe")
+                duplicate = _find_duplicate(dedupe, name_index, families, planned_sources, scan.dirpath,
+                                            final_name, original_basename, file_st)
+                timer.stop()
+            if duplicate is not None:
+                original_name, current_name, original_st = duplicate
+                counters.duplicates_found_count += 1
+                if original_st.st_ino == file_st.st_ino:
+                    vprint(f"  - Duplicate: already a hard link to '{current_name}', leaving it in place.")
+                    plan.kept.add(KeptFile(original_basename, scanned_mode))
+                elif dedupe.link:
+                    print(f"Duplicate: {original_filepath} is identical to {os.path.join(scan.dirpath, original_name)}; "
+                          f"replacing it with a hard link.")
+                    plan.duplicates.add(DuplicateFile(original_basename, original_name, original_st.st_ino,
+                                                      original_st.st_size, original_st.st_mtime_ns,
+                                                      file_st.st_ino, file_st.st_size, file_st.st_mtime_ns,
+                                                      scanned_mode))
+                else:
+                    print(f"Duplicate: {original_filepath} is identical to {os.path.join(scan.dirpath, original_name)}; "
+                          f"leaving it in place.")
+                    plan.kept.add(KeptFile(original_basename, scanned_mode))
+                continue
+
+        temp_final_name = name_index.claim(final_name, original_basename)
+        if temp_final_name != final_name and temp_final_name != original_basename:
+            vprint(f"  - Target '{final_name}' exists or conflicts, using '{temp_final_name}'.")
+
+        if temp_final_name == original_basename:
+            vprint(f"  - Skipping (resolved to no change after conflict check).")
+            counters.skipped_no_change_count +=1
+            plan.kept.add(KeptFile(original_basename, scanned_mode))
+            continue
+
+        if dedupe is not None:
+            planned_sources[temp_final_name] = original_basename
+            family = families.get(final_name)
+            if family is not None:
+                try:
+                    file_st = resolved.dir_entry.stat(follow_symlinks=False)
+                    family.setdefault(file_st.st_size, []).append((temp_final_name, original_basename, file_st))
+                except OSError:
+                    pass
+
+        final_name = temp_final_name
+        vprint(f"  - Final target name: '{final_name}' (Date from: {date_source})")
+        plan.renames.add(PlannedRename(final_name, original_basename, date_source, scanned_mode))
+    
+    vprint("\n--- Scan Summary ---") 
+    if verbose: 
+        if counters.skipped_datestamped_no_force_count > 0:
+            vprint(f"  Skipped (starts with correct date, no -f): {counters.skipped_datestamped_no_force_count}")
+        if counters.skipped_empty_after_strip_count > 0:
+            vprint(f"  Skipped (empty/invalid after stripping): {counters.skipped_empty_after_strip_count}")
+        if counters.skipped_contains_date_no_force_count > 0:
+            vprint(f"  Skipped (contained target date elsewhere, no -f): {counters.skipped_contains_date_no_force_count}")
+        if counters.skipped_no_change_count > 0: 
+             vprint(f"  Skipped (no change ultimately needed): {counters.skipped_no_change_count}")
+        if counters.duplicates_found_count > 0:
+            vprint(f"  Duplicates of files already using the target name: {counters.duplicates_found_count}")
+    
+    if dedupe is not None:
+        dedupe.flush()
+    timer.stop()
+    return plan
+
+
+def apply_plan(plan, verbose=False, timer=None, journal=None, on_rename=None):
+    """Carry out a RenamePlan: rename in sorted order, then clear executable bits.
+
+    Renames are streamed from the plan in order of new name, so a plan that
+    spilled to disk is never loaded whole. Duplicates planned by --dedupe link
+    are linked after the renames, once the names they link to exist. Returns the plan's RunCounters, now
+    including renames and permission changes, and closes the plan. Time spent
+    is charged to the "rename" phase of timer ("chmod" for permission changes
+    with a detailed timer). With a RenameJournal, the plan is recorded before
+    the first rename and each outcome after it. on_rename, if given, is called
+    as on_rename(dirpath, old_name, new_name) after each successful rename,
+    including the one that moves a duplicate's hard link into place.
+    """
+    vprint = _make_vprint(verbose)
+    timer = timer or PhaseTimer()
+    dirpath = plan.dirpath
+    counters = plan.counters
+
+    timer.start("rename")
+    dir_handle = DirectoryHandle(dirpath)
+    if not plan.renames:
+        vprint("No files to rename based on scan criteria.")
+    else:
+        if verbose:
+            vprint(f"\nPreview of renames ({len(plan.renames)} files):")
+            for planned in plan.renames:
+                vprint(f"  '{planned.old_name}' -> '{planned.new_name}' (using {planned.date_source} date)")
+        
+        first_seq = journal.record_plan(plan) if journal is not None else 0
         vprint("\nRenaming files...")
-        for new_name, (old_name, _) in sorted(seen.items()):
+        for seq, planned in enumerate(plan.renames, first_seq):
+            old_name, new_name = planned.old_name, planned.new_name
+            new_path = os.path.join(dirpath, new_name)
             try:
-                os.rename(old_name, new_name)
-                renamed_count +=1
-                successfully_renamed_original_paths.add(old_name)
-                vprint(f"  Renamed: '{os.path.basename(old_name)}' -> '{new_name}'")
-                if try_remove_executable_bits(new_name, args.verbose):
-                    total_permissions_adjusted +=1
+                dir_handle.rename(old_name, new_name)
             except Exception as e:
-                print(f"Error renaming {old_name} to {new_name}: {e}") 
-                eligible_files_not_renamed_paths.add(old_name) 
-
-    final_paths_to_chmod_original = eligible_files_not_renamed_paths - successfully_renamed_original_paths
-    if final_paths_to_chmod_original:
-        vprint(f"\nAdjusting permissions for {len(final_paths_to_chmod_original)} eligible file(s) that were not renamed (or failed rename)...")
-        for path_to_chmod in final_paths_to_chmod_original:
-            if os.path.exists(path_to_chmod):
-                if try_remove_executable_bits(path_to_chmod, args.verbose):
-                    total_permissions_adjusted += 1
+                print(f"Error renaming {os.path.join(dirpath, old_name)} to {new_path}: {e}") 
+                plan.kept.add(KeptFile(old_name, planned.mode))
+                if journal is not None:
+                    journal.record("failed", seq, str(e))
+                continue
+            if journal is not None:
+                journal.record("done", seq)
+            if on_rename is not None:
+                on_rename(dirpath, old_name, new_name)
+            counters.renamed_count +=1
+            vprint(f"  Renamed: '{old_name}' -> '{new_name}'")
+            timer.start_detail("chmod")
+            if try_remove_executable_bits(new_path, verbose, planned.mode, dir_handle):
+                counters.total_permissions_adjusted +=1
+            timer.stop_detail()
+
+    if plan.duplicates:
+        vprint(f"\nLinking {len(plan.duplicates)} duplicate(s) to the files they duplicate...")
+        for duplicate in plan.duplicates:
+            name, original_name = duplicate.name, duplicate.original_name
+            temp_name = f".{name}.{os.getpid()}.dedupe"
+            try:
+                original_st, duplicate_st = dir_handle.stat(original_name), dir_handle.stat(name)
+                if ((original_st.st_ino, original_st.st_size, original_st.st_mtime_ns)
+                        != (duplicate.original_ino, duplicate.original_size, duplicate.original_mtime_ns)
+                        or (duplicate_st.st_ino, duplicate_st.st_size, duplicate_st.st_mtime_ns)
+                        != (duplicate.ino, duplicate.size, duplicate.mtime_ns)):
+                    raise OSError(errno.ESTALE, "file changed since it was compared")
+                dir_handle.replace_with_link(original_name, name, temp_name)
+                if on_rename is not None:
+                    on_rename(dirpath, temp_name, name)
+                counters.duplicates_linked_count += 1
+                vprint(f"  Linked: '{name}' -> '{original_name}'")
+            except OSError as e:
+                print(f"Error linking {os.path.join(dirpath, name)} to {os.path.join(dirpath, original_name)}: {e}")
+                plan.kept.add(KeptFile(name, duplicate.mode))
+
+    if plan.kept:
+        vprint(f"\nAdjusting permissions for {len(plan.kept)} eligible file(s) that were not renamed (or failed rename)...")
+        timer.start_detail("chmod")
+        for kept in plan.kept:
+            if try_remove_executable_bits(os.path.join(dirpath, kept.name), verbose, kept.mode, dir_handle):
+                counters.total_permissions_adjusted += 1
+        timer.stop_detail()
         vprint("Permission adjustment for non-renamed files complete.")
+    dir_handle.close()
+    plan.close()
+    timer.stop()
+
+    return counters
+
+class RenameJournal:
+    """Append-only JSON-lines record of planned and completed renames.
+
+    Every rename of a plan is written as a "plan" record and fsync'ed before the
+    first rename starts; completions ("done", "failed", "undone") are appended
+    as they happen and fsync'ed every fsync_every records and on close. A run
+    that dies part way can then be finished with resume_journal() or reversed
+    with undo_journal() without rescanning or re-reading any metadata.
+    """
+
+    def __init__(self, path, fsync_every=JOURNAL_FSYNC_EVERY):
+        self.path = path
+        self.fsync_every = fsync_every
+        entries, _ = read_journal(path) if os.path.exists(path) else ({}, {})
+        self.next_seq = max(entries, default=0) + 1
+        self._unsynced = 0
+        created = not os.path.exists(path)
+        self.fp = open(path, "a", encoding="utf-8")
+        if created:
+            self._fsync_parent_directory()
+        elif self.fp.tell() > 0:
+            with open(path, "rb") as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b"\n":
+                    self.fp.write("\n") # Cut off a line torn by a crash
+
+    def _fsync_parent_directory(self):
+        try:
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+    def _write(self, record):
+        import json
+        # ASCII escapes keep undecodable filename bytes (surrogate escapes) writable and round-trippable.
+        self.fp.write(json.dumps(record) + "\n")
+        self._unsynced += 1
+
+    def sync(self):
+        if self._unsynced:
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+            self._unsynced = 0
+
+    def record_plan(self, plan):
+        """Write (and sync) one "plan" record per rename, numbered consecutively in
+        the plan's order; returns the first rename's seq."""
+        directory = os.path.abspath(plan.dirpath or os.curdir)
+        first_seq = self.next_seq
+        for planned in plan.renames:
+            self._write({"seq": self.next_seq, "op": "plan", "dir": directory,
+                         "src": planned.old_name, "dst": planned.new_name, "source": planned.date_source})
+            self.next_seq += 1
+        self.sync()
+        return first_seq
+
+    def record(self, op, seq, error=None):
+        record = {"seq": seq, "op": op}
+        if error is not None:
+            record["error"] = error
+        self._write(record)
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def close(self):
+        self.sync()
+        self.fp.close()
+
+
+def read_journal(path):
+    """Return ({seq: plan record}, {seq: last completion op}) from a journal file.
+
+    A torn last line (from a crash mid-write) is ignored.
+    """
+    import json
+    entries = {}
+    states = {}
+    with open(path, encoding="utf-8") as fp:
+        for line in fp:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("op") == "plan":
+                entries[record["seq"]] = record
+            elif record.get("seq") in entries:
+                states[record["seq"]] = record["op"]
+    return entries, states
+
+
+def _replay_journal(path, verbose, select, forward):
+    vprint = _make_vprint(verbose)
+    entries, states = read_journal(path)
+    pending = sorted((seq for seq, entry in entries.items() if select(states.get(seq), entry)), reverse=not forward)
+    counters = RunCounters()
+    if not pending:
+        vprint(f"Nothing to {'resume' if forward else 'undo'} in journal {path}.")
+        return counters
+
+    journal = RenameJournal(path)
+    try:
+        for seq in pending:
+            entry = entries[seq]
+            src_path = os.path.join(entry["dir"], entry["src"])
+            dst_path = os.path.join(entry["dir"], entry["dst"])
+            from_path, to_path = (src_path, dst_path) if forward else (dst_path, src_path)
+            done_op = "done" if forward else "undone"
+            from_exists, to_exists = os.path.lexists(from_path), os.path.lexists(to_path)
+            if not from_exists and to_exists:
+                vprint(f"  Already applied: '{os.path.basename(from_path)}' -> '{os.path.basename(to_path)}'")
+                journal.record(done_op, seq)
+                continue
+            if not from_exists or to_exists:
+                reason = "target already exists" if to_exists else "source is missing"
+                print(f"Error renaming {from_path} to {to_path}: {reason}")
+                journal.record("failed" if forward else "undo-failed", seq, reason)
+                continue
+            try:
+                os.rename(from_path, to_path)
+            except OSError as e:
+                print(f"Error renaming {from_path} to {to_path}: {e}")
+                journal.record("failed" if forward else "undo-failed", seq, str(e))
+                continue
+            journal.record(done_op, seq)
+            counters.renamed_count += 1
+            vprint(f"  Renamed: '{os.path.basename(from_path)}' -> '{os.path.basename(to_path)}'")
+            if forward and try_remove_executable_bits(to_path, verbose):
+                counters.total_permissions_adjusted += 1
+    finally:
+        journal.close()
+    return counters
+
+
+def resume_journal(path, verbose=False):
+    """Carry out the planned renames of a journal that were never completed.
+
+    Entries whose rename already happened (source gone, target present) are
+    only marked done. Returns a RunCounters.
+    """
+    return _replay_journal(path, verbose, lambda state, entry: state is None, forward=True)
+
+
+def _applied_without_record(entry):
+    # "done" records are only fsynced every JOURNAL_FSYNC_EVERY renames, so after a crash a
+    # completed rename may have none; source gone and target present shows it happened.
+    return (not os.path.lexists(os.path.join(entry["dir"], entry["src"]))
+            and os.path.lexists(os.path.join(entry["dir"], entry["dst"])))
+
+
+def undo_journal(path, verbose=False):
+    """Reverse every completed rename recorded in a journal, newest first.
+
+    A planned rename with no recorded outcome counts as completed when its
+    source is gone and its target present, as after a crash. Executable bits
+    removed by the run are not restored. Returns a RunCounters.
+    """
+    return _replay_journal(path, verbose,
+                           lambda state, entry: state == "done" or (state is None and _applied_without_record(entry)),
+                           forward=False)
+
+
+class InotifyWatcher:
+    """Minimal ctypes binding to Linux inotify, one watch per directory.
+
+    Raises OSError if inotify is not available.
+    """
+
+    _EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len
+
+    def __init__(self):
+        import ctypes
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+            init = libc.inotify_init1
+        except (OSError, AttributeError) as e_libc:
+            raise OSError(f"inotify is not available: {e_libc}")
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self._get_errno = ctypes.get_errno
+        self.fd = init(IN_CLOEXEC)
+        if self.fd < 0:
+            err = self._get_errno()
+            raise OSError(err, f"inotify_init1: {os.strerror(err)}")
+        self.paths = {} # wd -> dirpath
+
+    def add_watch(self, dirpath, mask=WATCH_EVENT_MASK):
+        wd = self._add_watch(self.fd, os.fsencode(dirpath or os.curdir), mask)
+        if wd < 0:
+            err = self._get_errno()
+            raise OSError(err, os.strerror(err), dirpath or os.curdir)
+        self.paths[wd] = dirpath
+        return wd
+
+    def remove_watch(self, wd):
+        if self.paths.pop(wd, None) is not None:
+            self._rm_watch(self.fd, wd)
+
+    def read_events(self, timeout=None):
+        """Wait up to timeout seconds (None: forever) and return [(dirpath, mask, name)].
+
+        dirpath is None for events not tied to a watch (IN_Q_OVERFLOW). Returns
+        an empty list on timeout.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset + self._EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_length = self._EVENT_HEADER.unpack_from(data, offset)
+            offset += self._EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\x00"))
+            offset += name_length
+            dirpath = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+            if dirpath is not None or mask & IN_Q_OVERFLOW:
+                events.append((dirpath, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PathEntry:
+    """Stand-in for os.DirEntry for a file known by path (a scan candidate or a watch event).
+
+    Like DirEntry, stat results are fetched on first use and then cached, and
+    a file that is not a symlink costs a single lstat() for both kinds.
+    """
+
+    __slots__ = ("name", "path", "_stat", "_lstat")
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.path = path
+        self._stat = None
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        if not follow_symlinks or not stat.S_ISLNK(self._lstat.st_mode):
+            return self._lstat
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def is_file(self):
+        try:
+            return stat.S_ISREG(self.stat().st_mode)
+        except OSError:
+            return False
+
+
+def _watch_batch_scan(dirpath, names, directory_names):
+    # A DirectoryScan of just the named files, with the directory's full (event
+    # maintained) name set for collision checks.
+    scan = DirectoryScan(dirpath, complete=False)
+    scan.names = directory_names
+    for name in sorted(names):
+        if name.startswith('.'):
+            continue
+        scan.scanned_count += 1
+        if EXTENSIONS.search(name) and PathEntry(os.path.join(dirpath, name)).is_file():
+            scan.candidates.append(name)
+    return scan
+
+
+def watch_directories(watcher, roots, recursive, resolver, force=False, verbose=False, timer=None, journal=None,
+                      dedupe=None):
+    """Process roots once, then keep renaming files as they arrive, until interrupted.
+
+    watcher is an InotifyWatcher, which is closed on return. Every directory
+    is watched with inotify for files closed after writing
+    (IN_CLOSE_WRITE) or moved in (IN_MOVED_TO); with recursive, new
+    subdirectories are watched and processed too. Events are debounced into
+    batches (WATCH_DEBOUNCE_SECONDS / WATCH_MAX_DELAY_SECONDS) and only the
+    files named in them go through planning; each directory's name set for
+    collision checks is kept current from the events instead of rescanning.
+    Names this process renames files to are ignored when their events come
+    back. If the kernel's event queue overflows, every watched directory is
+    rescanned. Stops on Ctrl-C or SIGTERM and returns the RunCounters.
+    """
+    vprint = _make_vprint(verbose)
+    timer = timer or PhaseTimer()
+    counters = RunCounters()
+    directory_names = {} # dirpath -> every name in it, kept current from events
+    self_created = set() # (dirpath, name) renamed to by this process, until its IN_MOVED_TO is seen
+
+    def on_rename(dirpath, old_name, new_name):
+        names = directory_names.get(dirpath)
+        if names is not None:
+            names.discard(old_name)
+            names.add(new_name)
+        self_created.add((dirpath, new_name))
+
+    def watch(dirpath):
+        if dirpath not in directory_names:
+            try:
+                watcher.add_watch(dirpath)
+            except OSError as e_watch:
+                print(f"Warning: Could not watch directory {dirpath or os.curdir}: {e_watch}")
+                return
+            directory_names[dirpath] = set()
+
+    def full_pass(pass_roots):
+        for root in pass_roots:
+            watch(root)
+        for scan in walk_directories(pass_roots, recursive, timer):
+            for subdirectory in scan.subdirectories:
+                watch(subdirectory)
+            if scan.dirpath in directory_names:
+                directory_names[scan.dirpath] = set(scan.names)
+            plan = plan_directory(scan, resolver, force, verbose, timer, dedupe)
+            counters.merge(apply_plan(plan, verbose, timer, journal, on_rename))
+
+    def process_batch(pending):
+        for dirpath, names in pending.items():
+            names_in_dir = directory_names.get(dirpath)
+            if names_in_dir is None:
+                continue
+            scan = _watch_batch_scan(dirpath, names, names_in_dir)
+            plan = plan_directory(scan, resolver, force, verbose, timer, dedupe)
+            batch_counters = apply_plan(plan, verbose, timer, journal, on_rename)
+            counters.merge(batch_counters)
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {dirpath or os.curdir}: {len(scan.candidates)} new file(s), "
+                  f"{batch_counters.renamed_count} renamed")
+
+    previous_sigterm = signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        full_pass(roots)
+        vprint(f"\nWatching {len(directory_names)} director{'y' if len(directory_names) == 1 else 'ies'} for new files...")
+        pending = {}
+        new_directories = []
+        batch_started = None
+        while True:
+            events = watcher.read_events(None if batch_started is None else WATCH_DEBOUNCE_SECONDS)
+            for dirpath, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    print("Warning: inotify event queue overflowed; rescanning watched directories.")
+                    pending.clear()
+                    full_pass([root for root in roots if root in directory_names])
+                    continue
+                names = directory_names.get(dirpath)
+                if names is None:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    for wd, path in list(watcher.paths.items()):
+                        if path == dirpath:
+                            watcher.remove_watch(wd)
+                    del directory_names[dirpath]
+                    pending.pop(dirpath, None)
+                    continue
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    names.discard(name)
+                    pending.get(dirpath, set()).discard(name)
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    names.add(name)
+                if mask & IN_ISDIR:
+                    if recursive and mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                        new_directories.append(os.path.join(dirpath, name))
+                    continue
+                if mask & IN_MOVED_TO and (dirpath, name) in self_created:
+                    self_created.discard((dirpath, name))
+                    continue
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    pending.setdefault(dirpath, set()).add(name)
+                    if batch_started is None:
+                        batch_started = time.monotonic()
+
+            if new_directories:
+                full_pass(new_directories)
+                new_directories = []
+            if batch_started is not None and (not events or time.monotonic() - batch_started >= WATCH_MAX_DELAY_SECONDS):
+                process_batch(pending)
+                pending = {}
+                batch_started = None
+    except KeyboardInterrupt:
+        vprint("\nStopping watch.")
+    finally:
+        signal.signal(signal.SIGTERM, previous_sigterm)
+        watcher.close()
+    return counters
+
+
+def _percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted sequence.
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def collect_metrics(counters, timer, wall_seconds, cpu_seconds):
+    """Return the run's metrics as a JSON-serializable dict (see --metrics)."""
+    latencies = sorted(timer.samples.get("metadata", ()))
+    latency = {"count": len(latencies), "sum_seconds": sum(latencies)}
+    if latencies:
+        latency.update(p50_seconds=_percentile(latencies, 0.5), p99_seconds=_percentile(latencies, 0.99),
+                       max_seconds=latencies[-1])
+    return {
+        "timestamp": time.time(),
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "phases": {name: {"wall_seconds": timer.seconds[name], "cpu_seconds": timer.cpu_seconds.get(name)}
+                   for name in timer.seconds},
+        "metadata_latency": latency,
+        "date_sources": dict(counters.date_source_counts),
+        "counters": {name: value for name, value in vars(counters).items() if not isinstance(value, dict)},
+    }
+
+
+def _prometheus_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus_metrics(metrics):
+    """Render collect_metrics() output in the Prometheus text exposition format."""
+    lines = []
+
+    def family(name, metric_type, help_text, samples):
+        lines.append(f"# HELP all_ctime_{name} {help_text}")
+        lines.append(f"# TYPE all_ctime_{name} {metric_type}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(f'{key}="{_prometheus_label(str(val))}"' for key, val in labels)
+            lines.append(f"all_ctime_{name}{suffix}{'{' + label_text + '}' if label_text else ''} {value!r}")
+
+    family("last_run_timestamp_seconds", "gauge", "Unix time the run finished.", [("", (), metrics["timestamp"])])
+    family("run_wall_seconds", "gauge", "Wall-clock duration of the run.", [("", (), metrics["wall_seconds"])])
+    family("run_cpu_seconds", "gauge", "CPU time of the main process.", [("", (), metrics["cpu_seconds"])])
+    phases = metrics["phases"]
+    family("phase_wall_seconds", "gauge", "Wall-clock seconds charged to each phase.",
+           [("", (("phase", name),), phase["wall_seconds"]) for name, phase in phases.items()])
+    family("phase_cpu_seconds", "gauge", "Main-process CPU seconds charged to each phase.",
+           [("", (("phase", name),), phase["cpu_seconds"]) for name, phase in phases.items()
+            if phase["cpu_seconds"] is not None])
+    latency = metrics["metadata_latency"]
+    quantiles = [("", (("quantile", q),), latency[key]) for q, key in (("0.5", "p50_seconds"), ("0.99", "p99_seconds"))
+                 if key in latency]
+    family("metadata_latency_seconds", "summary", "Per-file EXIF/XMP extraction time (cache misses only).",
+           quantiles + [("_sum", (), latency["sum_seconds"]), ("_count", (), latency["count"])])
+    family("files_by_date_source", "gauge", "Eligible files by the source of their date.",
+           [("", (("source", source),), count) for source, count in sorted(metrics["date_sources"].items())])
+    for name, value in metrics["counters"].items():
+        family(name, "gauge", f"Run counter {name}.", [("", (), value)])
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, metrics):
+    """Write metrics to path, as Prometheus text if it ends in .prom, else as JSON.
+
+    The file is replaced atomically, so a textfile collector never reads a partial write.
+    """
+    if path.endswith(".prom"):
+        text = format_prometheus_metrics(metrics)
+    else:
+        import json
+        text = json.dumps(metrics, indent=2) + "\n"
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def main(argv=None, timer=None):
+    """Command-line entry point. Returns the run's RunCounters."""
+    parser = argparse.ArgumentParser(
+        description="Rename media files using EXIF or file creation date, and remove executable bits.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "-t", "--time_from_exif",
+        action="store_true",
+        help="Use EXIF date for filename if available.\n"
+             "If EXIF/XMP date is not found/readable, fallback to file creation time (ctime)."
+    )
+    parser.add_argument(
+        "-f", "--force",
+        action="store_true",
+        help="Force reprocessing of files. \n"
+             " - If file starts with the *correct* date, -f re-processes/re-cleans the suffix.\n"
+             " - If file has correct date *elsewhere* in name, -f processes it.\n"
+             " (Files starting with an *incorrect* date are now re-processed by default)."
+    )
+    parser.add_argument(
+        "-v", "--verbose",
+        action="store_true",
+        help="Enable verbose output, showing detailed processing information and previews."
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of worker processes for EXIF/XMP extraction with -t (default: 1, serial).\n"
+             "Use 0 for one worker per CPU. Renaming itself is always done in scan order."
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="With -t, keep N files opened ahead of the one being parsed (per worker) and ask\n"
+             f"the kernel to read their first {PREFETCH_BYTES // 1024} KB in the background (posix_fadvise),\n"
+             "so cold disks and network mounts see several reads queued at once (default: 0, off)."
+    )
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the metadata cache used with -t and --dedupe."
+    )
+    cache_group.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Discard the EXIF/XMP metadata cache and re-extract every file with -t.\n"
+             f"The cache lives at $XDG_CACHE_HOME/all_ctime/{CACHE_FILENAME} (default ~/.cache)."
+    )
+    parser.add_argument(
+        "-r", "--recursive",
+        nargs="+",
+        metavar="PATH",
+        help="Process each PATH and all of its subdirectories instead of the current directory.\n"
+             "Directories are streamed one at a time; hidden entries are skipped and\n"
+             "symlinked directories are not followed."
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After processing, keep running and rename files as they are written or moved\n"
+             "into the directory (Linux inotify), batching bursts of arrivals. Stop with Ctrl-C."
+    )
+    parser.add_argument(
+        "--dedupe",
+        nargs="?",
+        const="report",
+        choices=("report", "link"),
+        help="When a file's new name is already taken, compare it with the files using that\n"
+             "name and its _1, _2, ... variants: size first, then a hash of the first and last\n"
+             f"{DEDUPE_PARTIAL_BYTES // 1024} KB, then a full hash only if those match. An identical file is reported\n"
+             "and left in place (report, the default) or replaced by a hard link to the file it\n"
+             "duplicates (link), instead of getting a new _N name. Hashes are kept in the\n"
+             "metadata cache, so unchanged files are not read again. Linked files share\n"
+             "one inode (editing one changes both); --undo does not separate them."
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        help="Append every planned rename to FILE (JSON lines) before renaming, and each\n"
+             "completed rename after it, so an interrupted run can be resumed or undone."
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="Write run metrics to FILE: wall/CPU time per phase (scan, stat, metadata,\n"
+             "normalize, plan, dedupe, rename, chmod), p50/p99 per-file metadata latency,\n"
+             "files per date source and the summary counters. JSON, or Prometheus text if FILE\n"
+             "ends in .prom."
+    )
+    journal_group = parser.add_mutually_exclusive_group()
+    journal_group.add_argument(
+        "--resume",
+        metavar="JOURNAL",
+        help="Finish the renames recorded in JOURNAL that were never completed, then exit.\n"
+             "No directories are scanned and no dates are re-read."
+    )
+    journal_group.add_argument(
+        "--undo",
+        metavar="JOURNAL",
+        help="Reverse every completed rename recorded in JOURNAL, newest first, then exit.\n"
+             "Executable bits removed by the original run are not restored."
+    )
+    args = parser.parse_args(argv)
+    for root in args.recursive or []:
+        if not os.path.isdir(root):
+            parser.error(f"--recursive: not a directory: {root}")
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive integer")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.prefetch < 0:
+        parser.error("--prefetch must be 0 or a positive integer")
+    for journal_path in filter(None, (args.resume, args.undo)):
+        if not os.path.isfile(journal_path):
+            parser.error(f"journal not found: {journal_path}")
+    if args.journal and (args.resume or args.undo):
+        parser.error("--journal cannot be combined with --resume or --undo")
+    if args.watch and (args.resume or args.undo):
+        parser.error("--watch cannot be combined with --resume or --undo")
+
+    if args.resume or args.undo:
+        if args.resume:
+            counters = resume_journal(args.resume, args.verbose)
+        else:
+            counters = undo_journal(args.undo, args.verbose)
+        print(f"\n--- Summary ---\nFiles renamed: {counters.renamed_count}")
+        if counters.total_permissions_adjusted > 0:
+            print(f"File permissions adjusted: {counters.total_permissions_adjusted}")
+        return counters
+
+    _verbose_mode = args.verbose
+    def vprint(*pargs, **kwargs):
+        if _verbose_mode:
+            print(*pargs, **kwargs)
+
+    run_started, run_cpu_started = time.perf_counter(), time.process_time()
+    counters = RunCounters()
+    timer = timer or PhaseTimer(detailed=bool(args.metrics))
+    roots = args.recursive or [""]
+    scans = None
+    if not args.recursive and not args.watch:
+        # Scan the one directory before anything else is set up: when no entry
+        # matches EXTENSIONS (a hook firing on an empty directory, say) the run
+        # ends here, without loading Pillow or opening the cache or journal.
+        timer.start("scan")
+        scans = [scan_directory("")]
+        timer.stop()
+
+    if scans is not None and not scans[0].candidates:
+        counters.scanned_files_count = scans[0].scanned_count
+        vprint("Scanning files...")
+        vprint("No files matching the media extensions; nothing to do.")
+    else:
+        watcher = None
+        if args.watch:
+            try:
+                watcher = InotifyWatcher()
+            except OSError as e_watch:
+                print(f"Error: --watch could not watch for changes: {e_watch}")
+                return counters
+
+        import importlib.util
+        if args.time_from_exif and importlib.util.find_spec("PIL") is None:
+            print("Warning: Pillow library is not installed, but -t flag was used. " 
+                  "EXIF/XMP data can only be read from JPEG, PNG, WebP and TIFF headers (and "
+                  "creation dates from MP4/QuickTime and Matroska/WebM containers); "
+                  "other files will use file creation time (ctime) instead.\n"
+                  "To enable full EXIF/XMP processing, install Pillow: pip install Pillow")
+
+        resolver = DateResolver(args.time_from_exif, args.jobs, open_metadata_cache(args, vprint), args.prefetch)
+        dedupe = DuplicateFinder(args.dedupe == "link", resolver.metadata_cache) if args.dedupe else None
+        journal = RenameJournal(args.journal) if args.journal else None
+
+        vprint("Scanning files...")
+        try:
+            if args.watch:
+                counters = watch_directories(watcher, roots, bool(args.recursive), resolver, args.force,
+                                             args.verbose, timer, journal, dedupe)
+            else:
+                for scan in scans or walk_directories(roots, bool(args.recursive), timer):
+                    plan = plan_directory(scan, resolver, args.force, args.verbose, timer, dedupe)
+                    counters.merge(apply_plan(plan, args.verbose, timer, journal))
+        finally:
+            resolver.close()
+            if journal is not None:
+                journal.close()
 
     print("\n--- Summary ---")
-    print(f"Total files scanned: {scanned_files_count}")
-    print(f"Eligible media files: {eligible_files_count}")
+    print(f"Total files scanned: {counters.scanned_files_count}")
+    print(f"Eligible media files: {counters.eligible_files_count}")
     
-    if renamed_count > 0:
-        print(f"Files renamed: {renamed_count}")
-    elif eligible_files_count > 0 :
+    if counters.renamed_count > 0:
+        print(f"Files renamed: {counters.renamed_count}")
+    elif counters.eligible_files_count > 0 :
         print("No files were renamed (e.g., already correct, skipped, or no changes identified).")
     else: 
         print("No eligible media files found to process or rename.")
         
-    if total_permissions_adjusted > 0:
-        print(f"File permissions adjusted: {total_permissions_adjusted}")
-    elif eligible_files_count > 0:
+    if counters.duplicates_found_count > 0:
+        print(f"Duplicates found: {counters.duplicates_found_count}")
+    if counters.duplicates_linked_count > 0:
+        print(f"Duplicates replaced by hard links: {counters.duplicates_linked_count}")
+
+    if counters.total_permissions_adjusted > 0:
+        print(f"File permissions adjusted: {counters.total_permissions_adjusted}")
+    elif counters.eligible_files_count > 0:
         vprint("No file permissions required changes (or adjustments failed where noted).")
 
+    if args.metrics:
+        metrics = collect_metrics(counters, timer, time.perf_counter() - run_started,
+                                  time.process_time() - run_cpu_started)
+        try:
+            write_metrics(args.metrics, metrics)
+        except OSError as e_metrics:
+            print(f"Warning: Could not write metrics to {args.metrics}: {e_metrics}")
+
+    return counters
+
 if __name__ == "__main__":
     main()
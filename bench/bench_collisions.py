@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Time all_ctime.py on a burst of files that all resolve to the same target name.
+
+Every generated file carries the same EXIF DateTimeOriginal and a name that
+normalizes to "burst.jpg", so with -t each one collides with all the files
+planned before it. This is the camera burst-mode case the collision resolver
+has to handle without per-probe stat() calls.
+
+usage: bench/bench_collisions.py [--files N] [--dir TMPDIR]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import corpus
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "all_ctime.py")
+BURST_DATE = "2024:01:01 12:00:00"
+
+
+def build_corpus(directory, count):
+    data = corpus.make_jpeg(BURST_DATE)
+    for i in range(count):
+        with open(os.path.join(directory, corpus.noise_name("burst", i) + ".jpg"), "wb") as f:
+            f.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10000, help="Number of same-second files (default: 10000).")
+    parser.add_argument("--dir", default="/dev/shm" if os.path.isdir("/dev/shm") else None,
+                        help="Parent directory for the corpus (default: /dev/shm when available).")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="all_ctime_bench_", dir=args.dir)
+    try:
+        build_corpus(workdir, args.files)
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.abspath(SCRIPT), "-t", "--no-cache"],
+                                cwd=workdir, capture_output=True, text=True, check=True)
+        elapsed = time.perf_counter() - start
+        renamed = len([name for name in os.listdir(workdir) if name.startswith("2024.01.01.12.00.00_burst")])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"files: {args.files}")
+    print(f"renamed: {renamed}")
+    print(f"elapsed: {elapsed:.3f}s ({args.files / elapsed:.0f} files/sec)")
+    if renamed != args.files:
+        print(result.stdout)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Check all_ctime.normalize_name() against the original inline logic, then time both.
+
+A reference copy of the name handling that used to live in main() (regex
+cleanup with uncompiled patterns, up to three STANDALONE_DATE_STAMP_REGEX
+scans for leading stamps) is kept below. Random names, biased toward the
+awkward cases (stacked stamps, stripped characters, non-ASCII whitespace,
+extension-only remainders), are run through both; any difference in the
+resulting name, skip reason, verbose lines or warnings fails the run.
+
+usage: bench/bench_normalizer.py [--names N] [--seed S]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import all_ctime  # noqa: E402
+
+DATE_STAMP_FORMAT_REGEX_STR = r"\d{4}\.\d{2}\.\d{2}\.\d{2}\.\d{2}\.\d{2}"
+STANDALONE_DATE_STAMP_REGEX = re.compile(f"^{DATE_STAMP_FORMAT_REGEX_STR}")
+DATE_STAMP_LENGTH = 19
+
+
+def reference_normalize_name(original_basename, file_date_str, force, vprint):
+    """The pre-normalize_name() logic from main(), with `continue` turned into returns."""
+    filename_to_process = original_basename
+    is_already_datestamped_at_start_match = STANDALONE_DATE_STAMP_REGEX.match(original_basename)
+
+    if is_already_datestamped_at_start_match:
+        filename_current_date_prefix = original_basename[:DATE_STAMP_LENGTH]
+        vprint(f"  - File starts with a date stamp pattern: '{filename_current_date_prefix}'")
+
+        if filename_current_date_prefix == file_date_str:
+            if not force:
+                vprint(f"  - Skipping (starts with correct date '{file_date_str}' and no -f to re-process suffix).")
+                return None, "skipped_datestamped_no_force_count"
+            else:
+                vprint(f"  - Force mode: File starts with correct date '{file_date_str}'. Will strip and re-process suffix.")
+                temp_name = original_basename[DATE_STAMP_LENGTH:]
+                if temp_name.startswith("_"):
+                    temp_name = temp_name[1:]
+                filename_to_process = temp_name
+
+                temp_base, temp_ext = os.path.splitext(filename_to_process)
+                if not temp_base and filename_to_process.startswith('.'):
+                    filename_to_process = f"recovered{filename_to_process}"
+                    vprint(f"  - Name became extension-only after stripping correct date, set to '{filename_to_process}'")
+                elif not filename_to_process or not temp_base:
+                    print(f"Warning: Filename '{original_basename}' became invalid ('{filename_to_process}') after stripping correct date with -f. Skipping.")
+                    return None, "skipped_empty_after_strip_count"
+        else:
+            vprint(f"  - File starts with date '{filename_current_date_prefix}', but new date is '{file_date_str}'. Will re-process.")
+            vprint(f"  - Stripping leading incorrect date stamp(s)...")
+            temp_name = original_basename
+            stripped_count = 0
+            for i_strip in range(2):
+                match_obj_strip = STANDALONE_DATE_STAMP_REGEX.match(temp_name)
+                if match_obj_strip:
+                    old_temp_name_in_strip = temp_name
+                    temp_name = temp_name[DATE_STAMP_LENGTH:]
+                    if temp_name.startswith("_"):
+                        temp_name = temp_name[1:]
+                    stripped_count += 1
+                    vprint(f"    - Strip {i_strip+1}: '{old_temp_name_in_strip[:DATE_STAMP_LENGTH + (1 if old_temp_name_in_strip[DATE_STAMP_LENGTH:].startswith('_') else 0)]}' -> remaining: '{temp_name}'")
+                else:
+                    break
+            if stripped_count > 0:
+                filename_to_process = temp_name
+                vprint(f"  - Base name after stripping incorrect date(s): '{filename_to_process}'")
+                temp_base, temp_ext = os.path.splitext(filename_to_process)
+                if not temp_base and filename_to_process.startswith('.'):
+                    filename_to_process = f"recovered{filename_to_process}"
+                    vprint(f"  - Name became extension-only, set to '{filename_to_process}'")
+                elif not filename_to_process or not temp_base:
+                    print(f"Warning: Filename '{original_basename}' became invalid ('{filename_to_process}') after stripping incorrect date(s). Skipping.")
+                    return None, "skipped_empty_after_strip_count"
+    elif file_date_str in original_basename and not force:
+        vprint(f"  - Skipping (already contains target date '{file_date_str}' elsewhere, no -f).")
+        return None, "skipped_contains_date_no_force_count"
+
+    name_part, ext_part = os.path.splitext(filename_to_process)
+    processed_name_part = name_part.lower()
+    processed_ext_part = ext_part.lower()
+
+    if processed_ext_part == ".jpeg":
+        processed_ext_part = ".jpg"
+
+    processed_name_part = re.sub(r'[\[\]\(\)]', '', processed_name_part)
+    processed_name_part = re.sub(r'[\s,+&]', '', processed_name_part)
+    processed_name_part = re.sub(r'^_+', '', processed_name_part)
+
+    processed_name_part = re.sub(r'^\.+', '', processed_name_part)
+
+    if not processed_name_part:
+        processed_name_part = "untitled" if processed_ext_part else "untitled_file"
+
+    final_name_suffix = f"_{processed_name_part}{processed_ext_part}"
+    final_name = f"{file_date_str}{final_name_suffix}"
+    vprint(f"  - Proposed new name components: Date='{file_date_str}', Suffix='{final_name_suffix}' -> Tentative: '{final_name}'")
+    return final_name, None
+
+
+FRAGMENTS = ["IMG", "img", "_", "__", ".", "..", " ", "\t", "\x1c", "\xa0", "\u2003", "\u3000", "(", ")", "[", "]",
+             ",", "+", "&", "-", "1", "2024", "é", "İ", "K", "ß", ".JPEG", ".jpeg", ".JPG", ".png", ".Mp4"]
+DATES = ["2024.01.02.03.04.05", "2023.12.31.23.59.59"]
+
+
+def random_name(rng):
+    parts = []
+    for _ in range(rng.randint(0, 3)):
+        if rng.random() < 0.4:
+            parts.append(rng.choice(DATES + ["1999.09.09.09.09.09", "٢٠٢٤.01.02.03.04.05"]))
+            if rng.random() < 0.6:
+                parts.append("_")
+    parts.extend(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 6)))
+    if rng.random() < 0.2:
+        parts.append(rng.choice(DATES))
+    parts.append(rng.choice([".jpg", ".JPEG", ".png", ".mov", "", ".webp"]))
+    return "".join(parts)
+
+
+def run_captured(func, name, date, force):
+    lines = []
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        result = func(name, date, force, lines.append)
+    return result, lines, stdout.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=200000, help="Random names to check (default: 200000).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = [(random_name(rng), rng.choice(DATES), rng.random() < 0.5) for _ in range(args.names)]
+
+    for name, date, force in cases:
+        expected = run_captured(reference_normalize_name, name, date, force)
+        actual = run_captured(all_ctime.normalize_name, name, date, force)
+        if expected != actual:
+            print(f"MISMATCH for {name!r} (date {date}, force={force}):\n  reference: {expected}\n  current:   {actual}")
+            sys.exit(1)
+    print(f"{len(cases)} names: identical results, verbose lines and warnings")
+
+    def discard(*pargs, **kwargs):
+        pass
+
+    for label, func in (("reference", reference_normalize_name), ("normalize_name", all_ctime.normalize_name)):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for name, date, force in cases:
+                func(name, date, force, discard)
+            elapsed = time.perf_counter() - start
+        print(f"{label:>15}: {len(cases) / elapsed:,.0f} names/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Measure all_ctime.py startup: module import time and a run with nothing to do.
+
+Each sample is a fresh interpreter run with `python -X importtime`. The
+import-only runs report the cumulative import time of all_ctime and its
+slowest direct imports. The end-to-end runs call all_ctime (with -t) in an
+empty directory, the common case when it is fired from hooks, and are
+compared with a bare `python -c pass`. They are timed both ways it can be
+launched: as a script, which Python compiles from source on every run, and
+as an imported module, which loads the cached bytecode written here first.
+Neither may import the modules all_ctime.py loads only on first need
+(LAZY_MODULES); the script exits with status 1 if one is imported or if the
+median import time exceeds --max-import-ms.
+
+usage: bench/bench_startup.py [--runs N] [--max-import-ms MS]
+"""
+
+import argparse
+import importlib.util
+import os
+import py_compile
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+SCRIPT = os.path.join(REPO_DIR, "all_ctime.py")
+MODULE_MAIN = f"import sys; sys.path.insert(0, {os.path.abspath(REPO_DIR)!r}); import all_ctime; all_ctime.main()"
+# Imported by all_ctime.py only when a run needs them; a run with nothing to do must not load any.
+LAZY_MODULES = ("PIL", "sqlite3", "datetime", "json", "hashlib", "tempfile", "concurrent.futures")
+
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def run_importtime(args, cwd=None):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=cwd,
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="Interpreter launches per measurement (default: 20).")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="Fail if the median import time of all_ctime exceeds this many milliseconds.")
+    args = parser.parse_args()
+
+    # Refresh the bytecode cache, which an interpreter run with PYTHONDONTWRITEBYTECODE would not.
+    py_compile.compile(SCRIPT, cfile=importlib.util.cache_from_source(SCRIPT), doraise=True)
+    import_ms = []
+    direct_imports = {}
+    for _ in range(args.runs):
+        _, rows = run_importtime(["-c", "import all_ctime"], cwd=REPO_DIR)
+        index = next(i for i, row in enumerate(rows) if row[0] == "all_ctime")
+        _, _, cumulative, depth = rows[index]
+        import_ms.append(cumulative / 1000)
+        # all_ctime's imports are the deeper lines just before it; its direct ones are one level down.
+        while index > 0 and rows[index - 1][3] > depth:
+            index -= 1
+            name, _, cumulative, row_depth = rows[index]
+            if row_depth == depth + 1:
+                direct_imports.setdefault(name, []).append(cumulative / 1000)
+
+    workdir = tempfile.mkdtemp(prefix="all_ctime_bench_")
+    try:
+        env_dir = os.path.join(workdir, "empty")
+        os.mkdir(env_dir)
+        baseline_ms = [run_importtime(["-c", "pass"], cwd=env_dir)[0] * 1000 for _ in range(args.runs)]
+        script_ms, module_ms = [], []
+        loaded_lazy = set()
+        launches = ((script_ms, [os.path.abspath(SCRIPT), "-t"]), (module_ms, ["-c", MODULE_MAIN, "-t"]))
+        for _ in range(args.runs):
+            for samples, command in launches:
+                elapsed, rows = run_importtime(command, cwd=env_dir)
+                samples.append(elapsed * 1000)
+                loaded_lazy.update(name for name, _, _, _ in rows if name in LAZY_MODULES)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"import all_ctime (median of {args.runs}): {statistics.median(import_ms):.1f} ms")
+    slowest = sorted(direct_imports.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:8]
+    for name, samples in slowest:
+        print(f"  {name:<24} {statistics.median(samples):6.1f} ms")
+    print(f"python -c pass:                      {statistics.median(baseline_ms):6.1f} ms")
+    print(f"all_ctime.py -t, empty dir:          {statistics.median(script_ms):6.1f} ms")
+    print(f"import all_ctime; main(), empty dir: {statistics.median(module_ms):6.1f} ms")
+
+    failed = False
+    if loaded_lazy:
+        print(f"FAIL: run with nothing to do imported {', '.join(sorted(loaded_lazy))}")
+        failed = True
+    if args.max_import_ms is not None and statistics.median(import_ms) > args.max_import_ms:
+        print(f"FAIL: import time above {args.max_import_ms:.1f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
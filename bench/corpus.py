@@ -0,0 +1,176 @@
+"""Synthetic media corpus for benchmarking all_ctime.py and all_mtime.pl.
+
+Files are built byte by byte (no Pillow needed): structurally valid JPEG, PNG
+and WebP containers with optional EXIF DateTimeOriginal and XMP CreateDate
+blocks, followed by a filler payload standing in for image data. MP4 and WebM
+files carry the EXIF date (read as UTC) as their mvhd creation_time or
+DateUTC instead. They are not decodable media, but every container walker in
+all_ctime.py accepts them.
+"""
+
+import calendar
+import os
+import random
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+NAME_NOISE = "[]() ,+&"  # every one of these is removed by the name normalizer
+FORMATS = ("jpg", "png", "webp")
+_EPOCH = datetime(2015, 1, 1)
+
+
+def tiff_exif_block(exif_date):
+    """Big-endian TIFF structure: IFD0 -> ExifIFD -> DateTimeOriginal."""
+    date_bytes = exif_date.encode("ascii") + b"\x00"
+    tiff = b"MM\x00*" + struct.pack(">I", 8)
+    tiff += struct.pack(">H", 1) + struct.pack(">HHII", 0x8769, 4, 1, 26) + struct.pack(">I", 0)
+    tiff += struct.pack(">H", 1) + struct.pack(">HHII", 0x9003, 2, len(date_bytes), 44) + struct.pack(">I", 0)
+    return tiff + date_bytes
+
+
+def xmp_packet(xmp_date):
+    return (
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<rdf:Description xmlns:xmp="http://ns.adobe.com/xap/1.0/">'
+        f"<xmp:CreateDate>{xmp_date}</xmp:CreateDate>"
+        "</rdf:Description></rdf:RDF></x:xmpmeta>"
+    ).encode("utf-8")
+
+
+def make_jpeg(exif_date=None, xmp_date=None, payload_bytes=0):
+    data = b"\xff\xd8"
+    if exif_date:
+        app1 = b"Exif\x00\x00" + tiff_exif_block(exif_date)
+        data += b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+    if xmp_date:
+        app1 = b"http://ns.adobe.com/xap/1.0/\x00" + xmp_packet(xmp_date)
+        data += b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+    scan = b"\x00" * payload_bytes
+    data += b"\xff\xda" + struct.pack(">H", 2) + scan
+    return data + b"\xff\xd9"
+
+
+def _png_chunk(chunk_type, body):
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+
+def make_png(exif_date=None, xmp_date=None, payload_bytes=0):
+    data = b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+    if exif_date:
+        data += _png_chunk(b"eXIf", tiff_exif_block(exif_date))
+    if xmp_date:
+        data += _png_chunk(b"iTXt", b"XML:com.adobe.xmp\x00\x00\x00\x00\x00" + xmp_packet(xmp_date))
+    data += _png_chunk(b"IDAT", b"\x00" * payload_bytes)
+    return data + _png_chunk(b"IEND", b"")
+
+
+def _riff_chunk(chunk_type, body):
+    return chunk_type + struct.pack("<I", len(body)) + body + (b"\x00" if len(body) & 1 else b"")
+
+
+def make_webp(exif_date=None, xmp_date=None, payload_bytes=0):
+    image = _riff_chunk(b"VP8L", b"\x2f" + b"\x00" * (payload_bytes + 4))
+    if exif_date or xmp_date:
+        flags = (0x08 if exif_date else 0) | (0x04 if xmp_date else 0)
+        body = _riff_chunk(b"VP8X", struct.pack("<I", flags) + b"\x00" * 6) + image
+        if exif_date:
+            body += _riff_chunk(b"EXIF", tiff_exif_block(exif_date))
+        if xmp_date:
+            body += _riff_chunk(b"XMP ", xmp_packet(xmp_date))
+    else:
+        body = image
+    return b"RIFF" + struct.pack("<I", len(body) + 4) + b"WEBP" + body
+
+
+def _bmff_box(box_type, body):
+    return struct.pack(">I", len(body) + 8) + box_type + body
+
+
+def _utc_timestamp(exif_date):
+    return calendar.timegm(datetime.strptime(exif_date, "%Y:%m:%d %H:%M:%S").timetuple())
+
+
+def make_mp4(exif_date=None, xmp_date=None, payload_bytes=0, moov_last=False):
+    """ftyp + moov/mvhd (version 0) + mdat; moov_last puts the moov after the media data."""
+    created = _utc_timestamp(exif_date) + 2082844800 if exif_date else 0
+    mvhd = _bmff_box(b"mvhd", b"\x00\x00\x00\x00" + struct.pack(">IIII", created, created, 1000, 0) + b"\x00" * 80)
+    moov = _bmff_box(b"moov", mvhd)
+    mdat = _bmff_box(b"mdat", b"\x00" * payload_bytes)
+    ftyp = _bmff_box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41")
+    return ftyp + (mdat + moov if moov_last else moov + mdat)
+
+
+def _ebml_element(element_id, body):
+    return element_id + bytes([0x01]) + struct.pack(">Q", len(body))[1:] + body
+
+
+def make_webm(exif_date=None, xmp_date=None, payload_bytes=0):
+    """EBML header + Segment(Info[DateUTC], Cluster)."""
+    header = _ebml_element(b"\x1a\x45\xdf\xa3", _ebml_element(b"\x42\x82", b"webm"))
+    info_body = _ebml_element(b"\x2a\xd7\xb1", struct.pack(">I", 1000000))
+    if exif_date:
+        nanoseconds = (_utc_timestamp(exif_date) - 978307200) * 10**9
+        info_body += _ebml_element(b"\x44\x61", struct.pack(">q", nanoseconds))
+    cluster = _ebml_element(b"\x1f\x43\xb6\x75", b"\x00" * payload_bytes)
+    return header + _ebml_element(b"\x18\x53\x80\x67", _ebml_element(b"\x15\x49\xa9\x66", info_body) + cluster)
+
+
+MAKERS = {"jpg": make_jpeg, "png": make_png, "webp": make_webp, "mp4": make_mp4, "webm": make_webm}
+
+
+def noise_name(stem, i):
+    """stem plus a unique run of characters the normalizer strips, so names differ
+    on disk but all normalize to the same target."""
+    digits = []
+    while True:
+        i, rem = divmod(i, len(NAME_NOISE))
+        digits.append(NAME_NOISE[rem])
+        if i == 0:
+            break
+    return stem + "".join(digits)
+
+
+def generate_corpus(directory, files, datestamped=0.1, collisions=0.05, with_exif=0.5,
+                    with_xmp=0.1, formats=FORMATS, payload_bytes=1024, seed=0):
+    """Write `files` synthetic media files into directory and return a summary dict.
+
+    datestamped: share of names already carrying a leading date stamp (half the
+        correct EXIF date, half a stale one).
+    collisions: share of files that repeat the previous file's date and name stem,
+        producing same-second bursts that resolve to the same target name.
+    with_exif / with_xmp: share of files carrying each metadata block.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    summary = {"files": files, "datestamped": 0, "collisions": 0, "with_exif": 0, "with_xmp": 0,
+               "formats": {fmt: 0 for fmt in formats}}
+
+    stem, taken_at, burst_index = None, None, 0
+    for i in range(files):
+        fmt = rng.choice(formats)
+        if stem is not None and rng.random() < collisions:
+            burst_index += 1
+            name_stem = noise_name(stem, burst_index)
+            summary["collisions"] += 1
+        else:
+            stem = f"img_{i:07d}"
+            taken_at = _EPOCH + timedelta(seconds=rng.randrange(10 * 365 * 86400))
+            burst_index = 0
+            name_stem = stem
+
+        exif_date = taken_at.strftime("%Y:%m:%d %H:%M:%S") if rng.random() < with_exif else None
+        xmp_date = taken_at.strftime("%Y-%m-%dT%H:%M:%S") if rng.random() < with_xmp else None
+        summary["with_exif"] += bool(exif_date)
+        summary["with_xmp"] += bool(xmp_date)
+
+        if rng.random() < datestamped:
+            stamp_at = taken_at if rng.random() < 0.5 else taken_at - timedelta(days=1)
+            name_stem = stamp_at.strftime("%Y.%m.%d.%H.%M.%S_") + name_stem
+            summary["datestamped"] += 1
+
+        name = f"{name_stem}.{fmt}"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(MAKERS[fmt](exif_date, xmp_date, payload_bytes))
+        summary["formats"][fmt] += 1
+    return summary
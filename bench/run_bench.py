@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Benchmark the all_ctime.py rename pipeline on synthetic corpora.
+
+For every (file count, mode) pair a fresh corpus is generated on tmpfs and
+all_ctime.main() is run in a separate worker process, so peak RSS belongs to
+that run alone. The worker reports wall time per phase (scan, metadata, plan,
+rename) from all_ctime's PhaseTimer. Results are printed as a table and can be
+written to JSON and compared against an earlier run with --baseline.
+
+usage: bench/run_bench.py [--files N ...] [--modes MODE ...] [--output FILE]
+                          [--baseline FILE] [--perl] [--dir TMPDIR]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import corpus  # noqa: E402
+
+# mode name -> (all_ctime.py arguments, untimed warm-up runs before the timed one)
+MODES = {
+    "ctime": ([], 0),
+    "exif": (["-t", "--no-cache"], 0),
+    "exif-jobs": (["-t", "--no-cache", "-j", "0"], 0),
+    "exif-prefetch": (["-t", "--no-cache", "--prefetch", "32"], 0),
+    "exif-cached-rerun": (["-t"], 1),
+}
+PERL_MODE = "perl-mtime"
+
+
+def run_worker(workdir, mode):
+    """Runs inside the worker process: time one all_ctime.main() call in workdir."""
+    os.chdir(workdir)
+    if mode == PERL_MODE:
+        start = time.perf_counter()
+        subprocess.run(["perl", os.path.join(REPO_DIR, "all_mtime.pl")], check=True,
+                       stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        return {"total": elapsed, "phases": {},
+                "peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss, "counters": {}}
+
+    sys.path.insert(0, REPO_DIR)
+    import all_ctime
+
+    argv, warmups = MODES[mode]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(warmups):
+            all_ctime.main(argv)
+        timer = all_ctime.PhaseTimer()
+        start = time.perf_counter()
+        counters = all_ctime.main(argv, timer)
+        elapsed = time.perf_counter() - start
+    peak_rss_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {"total": elapsed, "phases": timer.seconds, "peak_rss_kb": peak_rss_kb,
+            "counters": vars(counters)}
+
+
+def run_scenario(parent_dir, files, mode, corpus_options):
+    workdir = tempfile.mkdtemp(prefix="all_ctime_bench_", dir=parent_dir)
+    try:
+        summary = corpus.generate_corpus(os.path.join(workdir, "media"), files, **corpus_options)
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(workdir, "cache"))
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", os.path.join(workdir, "media"), mode],
+            env=env, capture_output=True, text=True, check=True,
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    measured = json.loads(result.stdout)
+    measured.update({
+        "mode": mode,
+        "files": files,
+        "files_per_sec": files / measured["total"] if measured["total"] else None,
+        "corpus": summary,
+    })
+    return measured
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+TABLE_PHASES = ("scan", "metadata", "plan", "rename")
+
+
+def print_header():
+    print(f"{'mode':<18} {'files':>8} {'total s':>9} " + " ".join(f"{p + ' s':>10}" for p in TABLE_PHASES)
+          + f" {'files/s':>10} {'peak RSS MB':>12}")
+
+
+def print_row(r):
+    phase_cols = " ".join(f"{r['phases'].get(p, 0.0):>10.3f}" for p in TABLE_PHASES)
+    print(f"{r['mode']:<18} {r['files']:>8} {r['total']:>9.3f} {phase_cols}"
+          f" {r['files_per_sec'] or 0:>10.0f} {r['peak_rss_kb'] / 1024:>12.1f}", flush=True)
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["mode"], r["files"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} (revision {baseline.get('git_revision')}):")
+    for r in results:
+        old = previous.get((r["mode"], r["files"]))
+        if old is None or not old.get("files_per_sec") or not r["files_per_sec"]:
+            continue
+        ratio = r["files_per_sec"] / old["files_per_sec"]
+        rss_ratio = r["peak_rss_kb"] / old["peak_rss_kb"] if old["peak_rss_kb"] else float("nan")
+        print(f"  {r['mode']:<18} {r['files']:>8}: {ratio:6.2f}x throughput, {rss_ratio:6.2f}x peak RSS")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        print(json.dumps(run_worker(sys.argv[2], sys.argv[3])))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Corpus sizes to run (default: 1000 10000 100000).")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES) + [PERL_MODE],
+                        help="all_ctime.py modes to run (default: all).")
+    parser.add_argument("--perl", action="store_true", help=f"Also time all_mtime.pl ({PERL_MODE}).")
+    parser.add_argument("--datestamped", type=float, default=0.1, help="Share of already date-stamped names.")
+    parser.add_argument("--collisions", type=float, default=0.05, help="Share of same-second burst files.")
+    parser.add_argument("--with-exif", type=float, default=0.5, help="Share of files with EXIF dates.")
+    parser.add_argument("--with-xmp", type=float, default=0.1, help="Share of files with XMP dates.")
+    parser.add_argument("--payload-bytes", type=int, default=1024, help="Filler bytes after the headers.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default="/dev/shm" if os.path.isdir("/dev/shm") else None,
+                        help="Parent directory for corpora (default: /dev/shm when available).")
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", help="Earlier --output JSON to compare throughput against.")
+    args = parser.parse_args()
+
+    modes = list(args.modes)
+    if args.perl and PERL_MODE not in modes:
+        modes.append(PERL_MODE)
+    corpus_options = {
+        "datestamped": args.datestamped, "collisions": args.collisions, "with_exif": args.with_exif,
+        "with_xmp": args.with_xmp, "payload_bytes": args.payload_bytes, "seed": args.seed,
+    }
+
+    results = []
+    print_header()
+    for files in args.files:
+        for mode in modes:
+            results.append(run_scenario(args.dir, files, mode, corpus_options))
+            print_row(results[-1])
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_options": corpus_options,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.baseline:
+        print_comparison(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""--journal / --resume / --undo with a file name that is not valid UTF-8.
+
+run with: python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import all_ctime  # noqa: E402
+
+BAD_NAME = os.fsdecode(b"bad\xff.jpg")
+
+
+class UndecodableNameJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="all_ctime_test_")
+        self.media = os.path.join(self.workdir, "media")
+        os.mkdir(self.media)
+        try:
+            with open(os.path.join(self.media, BAD_NAME), "wb") as f:
+                f.write(b"not really a jpeg")
+        except (OSError, UnicodeEncodeError):
+            shutil.rmtree(self.workdir)
+            self.skipTest("filesystem does not accept non-UTF-8 file names")
+        self.journal = os.path.join(self.workdir, "journal.jsonl")
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.media)
+
+    def run_main(self, *argv):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return all_ctime.main(["--no-cache"] + list(argv))
+
+    def renamed_name(self):
+        names = os.listdir(self.media)
+        self.assertEqual(len(names), 1)
+        self.assertNotEqual(names[0], BAD_NAME)
+        self.assertTrue(names[0].endswith(os.fsdecode(b"_bad\xff.jpg")))
+        return names[0]
+
+    def test_undo(self):
+        self.assertEqual(self.run_main("--journal", self.journal).renamed_count, 1)
+        self.renamed_name()
+        self.assertEqual(self.run_main("--undo", self.journal).renamed_count, 1)
+        self.assertEqual(os.listdir(self.media), [BAD_NAME])
+
+    def test_resume(self):
+        self.run_main("--journal", self.journal)
+        new_name = self.renamed_name()
+        # Turn the journal into one from a run interrupted right after recording its plan.
+        with open(self.journal, encoding="utf-8") as f:
+            plan_lines = [line for line in f if json.loads(line)["op"] == "plan"]
+        with open(self.journal, "w", encoding="utf-8") as f:
+            f.writelines(plan_lines)
+        os.rename(new_name, BAD_NAME)
+
+        self.assertEqual(self.run_main("--resume", self.journal).renamed_count, 1)
+        self.assertEqual(os.listdir(self.media), [new_name])
+
+    def test_undo_after_crash(self):
+        self.run_main("--journal", self.journal)
+        self.renamed_name()
+        # A crash before the "done" records were flushed leaves only the plan behind.
+        with open(self.journal, encoding="utf-8") as f:
+            plan_lines = [line for line in f if json.loads(line)["op"] == "plan"]
+        with open(self.journal, "w", encoding="utf-8") as f:
+            f.writelines(plan_lines)
+
+        self.assertEqual(self.run_main("--undo", self.journal).renamed_count, 1)
+        self.assertEqual(os.listdir(self.media), [BAD_NAME])
+
+
+if __name__ == "__main__":
+    unittest.main()